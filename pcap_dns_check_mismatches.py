@@ -0,0 +1,1008 @@
+#!/usr/bin/env python3
+"""
+DNS Query/Response Matching - single-pass engine for pcap_dns_check_mismatches.sh
+
+Reads each capture once (no tshark), keeps outstanding queries in a hash
+keyed on (src, sport, dst, dport, dns.id) and evicts the ones that never
+get an answer with a timing wheel, so memory follows the number of queries
+in flight rather than the size of the capture.
+
+DNS over UDP and TCP port 53 is matched, like tshark's "dns" filter; TCP
+streams are reassembled per direction and split on the 2-byte length
+prefix of every message.
+
+Options and output follow pcap_dns_check_mismatches.sh; a query is held
+for --evict-after seconds (default: twice --timeout), so answers later
+than --timeout are still matched and reported as exceeding it.
+
+Batch mode (-f) matches files in parallel with --jobs and walks them in
+first-packet order, so a query at the end of one rotated capture is
+matched by a response at the start of the next.
+"""
+
+import argparse
+import calendar
+import glob
+import io
+import json
+import math
+import os
+import socket
+import struct
+import sys
+import time
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import BinaryIO, Iterator, List, Optional, TextIO, Tuple
+
+from dns_qtype_parser import (decode_ip, decode_tcp, decode_udp_datagram, open_input,
+                              parse_question, read_pcap_records, type_name, write_json)
+
+RED = '\033[0;31m'
+GREEN = '\033[0;32m'
+YELLOW = '\033[1;33m'
+BLUE = '\033[0;34m'
+NC = '\033[0m'
+
+RCODES = {
+    0: "NOERROR", 1: "FORMERR", 2: "SERVFAIL", 3: "NXDOMAIN", 4: "NOTIMP",
+    5: "REFUSED", 6: "YXDOMAIN", 7: "YXRRSET", 8: "NXRRSET", 9: "NOTAUTH",
+    10: "NOTZONE", 11: "DSOTYPENI",
+}
+
+# Width of one timing wheel slot in seconds
+WHEEL_RESOLUTION = 0.25
+
+
+class Packet:
+    """One decoded DNS query or response."""
+
+    __slots__ = ("frame", "time", "src", "sport", "dst", "dport", "dns_id",
+                 "qname", "qtype", "rcode", "matched", "raw")
+
+    def __init__(self, frame, time, src, sport, dst, dport, dns_id, qname, qtype, rcode, raw):
+        self.frame = frame
+        self.time = time
+        self.src = src
+        self.sport = sport
+        self.dst = dst
+        self.dport = dport
+        self.dns_id = dns_id
+        self.qname = qname
+        self.qtype = qtype
+        self.rcode = rcode
+        self.matched = False
+        self.raw = raw
+
+    @property
+    def key(self) -> Tuple[bytes, int, bytes, int, int]:
+        return self.src, self.sport, self.dst, self.dport, self.dns_id
+
+    @property
+    def reply_key(self) -> Tuple[bytes, int, bytes, int, int]:
+        """Key of the query this response answers (direction reversed)."""
+        return self.dst, self.dport, self.src, self.sport, self.dns_id
+
+
+class TimingWheel:
+    """
+    Hashed timing wheel: slot i holds the entries that expire during the
+    i-th resolution-wide tick. Inserting is O(1) and advancing touches only
+    the slots that elapsed, however many entries are outstanding.
+    """
+
+    def __init__(self, horizon: float, resolution: float = WHEEL_RESOLUTION):
+        self.resolution = resolution
+        self.slots = [[] for _ in range(int(horizon / resolution) + 2)]
+        self.tick = None
+
+    def insert(self, expires: float, entry) -> None:
+        tick = int(expires / self.resolution)
+        if self.tick is None:
+            self.tick = tick - len(self.slots) + 1
+        self.slots[tick % len(self.slots)].append(entry)
+
+    def advance(self, now: float) -> List:
+        """Remove and return every entry that expired at or before now."""
+        target = int(now / self.resolution)
+        if self.tick is None:
+            self.tick = target - 1
+            return []
+        expired = []
+        # Never sweep more than one full turn, even after a long gap
+        start = max(self.tick + 1, target - len(self.slots) + 1)
+        for tick in range(start, target):
+            slot = self.slots[tick % len(self.slots)]
+            if slot:
+                expired.extend(slot)
+                slot.clear()
+        self.tick = max(self.tick, target - 1)
+        return expired
+
+    def drain(self) -> List:
+        entries = [entry for slot in self.slots for entry in slot]
+        for slot in self.slots:
+            slot.clear()
+        return entries
+
+
+class Stats:
+    """Per-file counters, mergeable for batch summaries."""
+
+    def __init__(self):
+        self.queries = 0
+        self.responses = 0
+        self.matched = 0
+        self.missing_responses = 0
+        self.missing_queries = 0
+        self.timeout_exceeded = 0
+        self.rcodes = {}
+
+    def merge(self, other: "Stats") -> None:
+        for name in ("queries", "responses", "matched", "missing_responses",
+                     "missing_queries", "timeout_exceeded"):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        for rcode, count in other.rcodes.items():
+            self.rcodes[rcode] = self.rcodes.get(rcode, 0) + count
+
+    @property
+    def unmatched(self) -> int:
+        return self.missing_responses + self.missing_queries
+
+
+class LatencyHistogram:
+    """
+    Fixed-memory RTT histogram in the style of HdrHistogram. Values are
+    microseconds; below 2 * 2**SUB_BITS every value has its own bucket, above
+    that each power of two is split into 2**SUB_BITS linear buckets, so any
+    quantile is within 1/2**SUB_BITS (0.8%) of the true value from 1us to
+    days. Histograms with the same SUB_BITS merge by adding counts.
+    """
+
+    SUB_BITS = 7
+    MAX_VALUE = (1 << 40) - 1  # ~12.7 days in microseconds
+
+    def __init__(self):
+        self.counts = array('Q', bytes(8 * self.index(self.MAX_VALUE) + 8))
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    @classmethod
+    def index(cls, value: int) -> int:
+        shift = value.bit_length() - cls.SUB_BITS - 1
+        if shift <= 0:
+            return value
+        return (shift << cls.SUB_BITS) + (value >> shift)
+
+    @classmethod
+    def bucket_value(cls, index: int) -> int:
+        """Middle of the range of values that land in bucket index."""
+        shift = (index >> cls.SUB_BITS) - 1
+        if shift <= 0:
+            return index
+        low = (index - (shift << cls.SUB_BITS)) << shift
+        return low + (1 << (shift - 1))
+
+    def record(self, seconds: float) -> None:
+        # round(): 0.1 * 1e6 is 99999.99..., which int() would put in the bucket below
+        value = min(max(round(seconds * 1e6), 0), self.MAX_VALUE)
+        self.counts[self.index(value)] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        counts = self.counts
+        for i, n in enumerate(other.counts):
+            if n:
+                counts[i] += n
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q: float) -> float:
+        """Latency in seconds below which a fraction q of the samples fall."""
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(q * self.count))
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                # Exact extremes beat the bucket midpoint
+                return min(max(self.bucket_value(i), self.min), self.max) / 1e6
+        return self.max / 1e6
+
+    def to_dict(self) -> dict:
+        return {"sub_bits": self.SUB_BITS, "count": self.count, "total": self.total,
+                "min": self.min, "max": self.max,
+                "buckets": {str(i): n for i, n in enumerate(self.counts) if n}}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "LatencyHistogram":
+        if data["sub_bits"] != cls.SUB_BITS:
+            raise ValueError(f"histogram precision {data['sub_bits']} bits, expected {cls.SUB_BITS}")
+        hist = cls()
+        for i, n in data["buckets"].items():
+            hist.counts[int(i)] = n
+        hist.count = data["count"]
+        hist.total = data["total"]
+        hist.min = data["min"]
+        hist.max = data["max"]
+        return hist
+
+
+class LatencyStats:
+    """
+    Query-to-response RTT histograms per server, per QTYPE and overall.
+    Only unambiguous pairs are recorded: when one response answers several
+    copies of a retransmitted query it is unknown which copy it answers.
+    """
+
+    def __init__(self):
+        self.servers = {}
+        self.qtypes = {}
+        self.all = LatencyHistogram()
+
+    def record(self, query: Packet, seconds: float) -> None:
+        server = ip_text(query.dst)
+        hist = self.servers.get(server)
+        if hist is None:
+            hist = self.servers[server] = LatencyHistogram()
+        hist.record(seconds)
+        hist = self.qtypes.get(query.qtype)
+        if hist is None:
+            hist = self.qtypes[query.qtype] = LatencyHistogram()
+        hist.record(seconds)
+        self.all.record(seconds)
+
+    def merge(self, other: "LatencyStats") -> None:
+        for mine, theirs in ((self.servers, other.servers), (self.qtypes, other.qtypes)):
+            for key, hist in theirs.items():
+                if key in mine:
+                    mine[key].merge(hist)
+                else:
+                    mine[key] = hist
+        self.all.merge(other.all)
+
+    def to_dict(self) -> dict:
+        return {"version": 1,
+                "servers": {k: h.to_dict() for k, h in self.servers.items()},
+                "qtypes": {str(k): h.to_dict() for k, h in self.qtypes.items()},
+                "all": self.all.to_dict()}
+
+    @classmethod
+    def from_dict(cls, state: dict) -> "LatencyStats":
+        stats = cls()
+        stats.servers = {k: LatencyHistogram.from_dict(h) for k, h in state["servers"].items()}
+        stats.qtypes = {int(k): LatencyHistogram.from_dict(h) for k, h in state["qtypes"].items()}
+        stats.all = LatencyHistogram.from_dict(state["all"])
+        return stats
+
+    def save(self, path: str) -> None:
+        write_json(path, self.to_dict())
+
+    @classmethod
+    def load(cls, path: str) -> "LatencyStats":
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+
+class Reporter:
+    """Prints match events in pcap_dns_check_mismatches.sh's format."""
+
+    def __init__(self, out: TextIO, verbose: bool, quiet: bool, local_time: bool, timeout: float):
+        self.out = out
+        self.verbose = verbose
+        self.quiet = quiet
+        self.local_time = local_time
+        self.timeout = timeout
+
+    def line(self, text: str = "") -> None:
+        if not self.quiet:
+            self.out.write(text + "\n")
+
+    def date(self, ts: float) -> str:
+        if self.local_time:
+            return time.strftime("%Y-%m-%d %H:%M:%S %Z", time.localtime(int(ts)))
+        return time.strftime("%Y-%m-%d %H:%M:%S UTC", time.gmtime(int(ts)))
+
+    def matched(self, query: Packet, response: Packet, delta: float) -> None:
+        if self.verbose:
+            self.line(f"{GREEN}✓{NC} Query frame {query.frame} matched with response frame {response.frame}")
+            self.line(f"  DNS ID: {query.dns_id} | Query: {text(query.qname)} | Type: {query.qtype} | "
+                      f"Response time: {delta:.6f}s | RCODE: {response.rcode}")
+        if delta > self.timeout:
+            self.line(f"{YELLOW}⚠{NC} Response for frame {query.frame} exceeded timeout "
+                      f"({delta:.6f}s > {self.timeout:g}s)")
+
+    def unmatched(self, packet: Packet, is_query: bool) -> None:
+        if self.quiet:
+            return
+        if is_query:
+            self.line(f"{RED}✗ MISSING RESPONSE{NC} - Query frame {packet.frame} has no matching response")
+        else:
+            self.line(f"{RED}✗ MISSING QUERY{NC} - Response frame {packet.frame} has no matching query")
+        src = f"{ip_text(packet.src)}:{packet.sport}"
+        dst = f"{ip_text(packet.dst)}:{packet.dport}"
+        if self.verbose:
+            self.line(f"  Query Name:   {text(packet.qname)}")
+            self.line(f"  Query Type:   {packet.qtype}")
+            self.line(f"  Date/Time:    {self.date(packet.time)}")
+            self.line(f"  DNS ID:       {packet.dns_id}")
+            if not is_query:
+                self.line(f"  RCODE:        {packet.rcode}")
+            self.line(f"  Source IP:    {src}")
+            self.line(f"  Dest IP:      {dst}")
+        elif is_query:
+            self.line(f"  DNS ID: {packet.dns_id} | Query: {text(packet.qname)} | Type: {packet.qtype} | "
+                      f"Src: {src} → Dst: {dst}")
+        else:
+            self.line(f"  DNS ID: {packet.dns_id} | Query: {text(packet.qname)} | Type: {packet.qtype} | "
+                      f"RCODE: {packet.rcode} | Src: {src} → Dst: {dst}")
+
+
+class Matcher:
+    """
+    Streaming query/response matcher. A response answers the outstanding
+    queries with the reversed 5-tuple, the same DNS ID, qname and qtype;
+    queries still unanswered --evict-after seconds later are reported as
+    missing responses.
+
+    With carry set (batch mode over rotated captures), queries still
+    outstanding at the end of the file and unanswered responses from its
+    first --evict-after seconds are kept in leftover/early instead of being
+    reported, so carry_over() can pair them with the neighbouring files.
+    """
+
+    def __init__(self, reporter: Reporter, timeout: float, evict_after: float,
+                 keep_frames: bool = False, carry: bool = False):
+        self.reporter = reporter
+        self.timeout = timeout
+        self.evict_after = evict_after
+        self.keep_frames = keep_frames
+        self.carry = carry
+        self.stats = Stats()
+        self.pending = {}  # query key -> [Packet, ...] oldest first
+        self.wheel = TimingWheel(evict_after)
+        self.unmatched_frames = []  # (frame, time, raw) for -o
+        self.first = None
+        self.now = 0.0
+        self.leftover = []
+        self.early = []
+        self.latency = None  # LatencyStats for --latency
+
+    def advance(self, now: float) -> None:
+        if now > self.now:
+            self.now = now
+            for query in self.wheel.advance(now - self.evict_after):
+                self._expire(query)
+
+    def add(self, packet: Packet, is_response: bool) -> None:
+        if self.first is None:
+            self.first = packet.time
+        self.advance(packet.time)
+
+        if not is_response:
+            self.stats.queries += 1
+            self.pending.setdefault(packet.key, []).append(packet)
+            self.wheel.insert(packet.time, packet)
+            return
+
+        self.stats.responses += 1
+        rcode_name = RCODES.get(packet.rcode, f"RCODE{packet.rcode}")
+        self.stats.rcodes[rcode_name] = self.stats.rcodes.get(rcode_name, 0) + 1
+        if self.answer(packet):
+            return
+        if self.carry and packet.time < self.first + self.evict_after:
+            # May answer a query at the end of the previous capture
+            self.early.append(packet)
+            return
+        self.orphan(packet)
+
+    def answer(self, response: Packet) -> bool:
+        """Match a response against the outstanding queries; False if it answers none."""
+        waiting = self.pending.get(response.reply_key)
+        if not waiting:
+            return False
+        # Like the shell version, one response answers every outstanding
+        # copy of the query (client retransmissions included)
+        answered = [q for q in waiting if q.qname == response.qname and q.qtype == response.qtype]
+        if not answered:
+            return False
+        waiting[:] = [q for q in waiting if not q.matched and q not in answered]
+        if not waiting:
+            del self.pending[response.reply_key]
+        for query in answered:
+            query.matched = True
+            self.stats.matched += 1
+            delta = response.time - query.time
+            if delta > self.timeout:
+                self.stats.timeout_exceeded += 1
+            if self.latency is not None and len(answered) == 1:
+                self.latency.record(query, delta)
+            self.reporter.matched(query, response, delta)
+        return True
+
+    def orphan(self, response: Packet) -> None:
+        self.stats.missing_queries += 1
+        self.reporter.unmatched(response, is_query=False)
+        self._keep(response)
+
+    def resume(self, queries: List[Packet]) -> None:
+        """Take over queries left outstanding by a matcher run with carry."""
+        if queries:
+            self.advance(max(query.time for query in queries))
+        for query in queries:
+            self.pending.setdefault(query.key, []).append(query)
+            self.wheel.insert(query.time, query)
+
+    def _expire(self, query: Packet) -> None:
+        if query.matched:
+            return
+        waiting = self.pending.get(query.key)
+        if waiting:
+            waiting.remove(query)
+            if not waiting:
+                del self.pending[query.key]
+        self.stats.missing_responses += 1
+        self.reporter.unmatched(query, is_query=True)
+        self._keep(query)
+
+    def _keep(self, packet: Packet) -> None:
+        if self.keep_frames:
+            self.unmatched_frames.append((packet.frame, packet.time, packet.raw))
+
+    def finish(self) -> None:
+        """End of input: every query still outstanding has no response (or is carried)."""
+        queries = sorted(self.wheel.drain(), key=lambda q: q.frame)
+        if self.carry:
+            self.leftover = [query for query in queries if not query.matched]
+            self.pending.clear()
+            return
+        for query in queries:
+            self._expire(query)
+
+    def outstanding(self) -> int:
+        return sum(len(queries) for queries in self.pending.values())
+
+
+class FileResult:
+    """What a batch worker sends back for one capture."""
+
+    def __init__(self, path: str, matcher: Matcher, text: str, linktype: int):
+        self.path = path
+        self.stats = matcher.stats
+        self.text = text
+        self.linktype = linktype
+        self.unmatched_frames = matcher.unmatched_frames
+        self.leftover = matcher.leftover
+        self.early = matcher.early
+        self.latency = matcher.latency
+
+
+def text(name: bytes) -> str:
+    return name.decode(errors="replace")
+
+
+def ip_text(addr: bytes) -> str:
+    return socket.inet_ntop(socket.AF_INET if len(addr) == 4 else socket.AF_INET6, addr)
+
+
+class TcpStreams:
+    """
+    DNS over TCP, one byte stream per direction: each message is preceded by
+    its 2-byte length (RFC 1035 4.2.2) and may span segments, or share one
+    with others. Streams without a SYN in the capture are assumed to start
+    at a message boundary; after a gap the buffer restarts at the next
+    segment the same way.
+    """
+
+    MAX_STREAMS = 65536
+
+    def __init__(self):
+        self.streams = {}   # (src, sport, dst, dport) -> [next seq, buffered bytes]
+
+    def feed(self, key: tuple, seq: int, flags: int, payload: memoryview) -> List[bytes]:
+        if flags & 0x02:  # SYN
+            self.streams[key] = [(seq + 1) & 0xFFFFFFFF, bytearray()]
+            return []
+        stream = self.streams.get(key)
+        if payload:
+            if stream is None:
+                if len(self.streams) >= self.MAX_STREAMS:
+                    # Oldest first: drop a stream that probably ended unseen
+                    del self.streams[next(iter(self.streams))]
+                stream = self.streams[key] = [seq, bytearray()]
+            ahead = (seq - stream[0]) & 0xFFFFFFFF
+            if ahead >= 0x80000000:
+                # Retransmission; keep only what it adds
+                payload = payload[(stream[0] - seq) & 0xFFFFFFFF:]
+                seq = stream[0]
+            elif ahead:
+                del stream[1][:]
+            stream[0] = (seq + len(payload)) & 0xFFFFFFFF
+            stream[1] += payload
+        messages = []
+        if stream is not None:
+            buf = stream[1]
+            while len(buf) >= 2 and len(buf) >= 2 + ((buf[0] << 8) | buf[1]):
+                length = (buf[0] << 8) | buf[1]
+                messages.append(bytes(buf[2:2 + length]))
+                del buf[:2 + length]
+        if flags & 0x05:  # FIN or RST
+            self.streams.pop(key, None)
+        return messages
+
+
+def iter_dns_packets(input_file: BinaryIO, keep_frames: bool = False,
+                     start: Optional[float] = None, end: Optional[float] = None):
+    """Yield (Packet, is_response, linktype) for every DNS message on UDP/53 or TCP/53."""
+    tcp_streams = TcpStreams()
+    for number, (linktype, ts, frame) in enumerate(read_pcap_records(input_file), 1):
+        if start is not None and not start <= ts <= end:
+            continue
+        ip = decode_ip(linktype, frame)
+        if ip is None:
+            continue
+        proto, src, dst, segment = ip
+        if proto == 17:
+            udp = decode_udp_datagram(segment)
+            if udp is None or udp[0] != 53 and udp[1] != 53:
+                continue
+            sport, dport, payload = udp
+            messages = (payload,)
+        elif proto == 6:
+            tcp = decode_tcp(segment)
+            if tcp is None or tcp[0] != 53 and tcp[1] != 53:
+                continue
+            sport, dport, seq, flags, payload = tcp
+            messages = tcp_streams.feed((src, sport, dst, dport), seq, flags, payload)
+        else:
+            continue
+        for msg in messages:
+            if len(msg) < 12:
+                continue
+            question = parse_question(msg)
+            if question is None:
+                continue
+            flags = (msg[2] << 8) | msg[3]
+            packet = Packet(number, ts, src, sport, dst, dport, (msg[0] << 8) | msg[1],
+                            question[0], question[1], flags & 0x0F,
+                            bytes(frame) if keep_frames else None)
+            yield packet, bool(flags & 0x8000), linktype
+
+
+def write_pcap(path: str, linktype: int, frames: List[Tuple[int, float, bytes]]) -> None:
+    """Write frames (sorted by frame number) as a classic microsecond pcap."""
+    with open(path, 'wb') as f:
+        f.write(struct.pack("<IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 262144, linktype))
+        for _, ts, raw in sorted(frames):
+            sec, usec = divmod(round(ts * 1e6), 1000000)
+            f.write(struct.pack("<IIII", sec, usec, len(raw), len(raw)))
+            f.write(raw)
+
+
+def new_reporter(out: TextIO, options: argparse.Namespace) -> Reporter:
+    return Reporter(out, options.verbose, options.quiet, options.local_time, options.timeout)
+
+
+def match_file(pcap_file: str, options: argparse.Namespace, out: TextIO,
+               keep: bool = False, carry: bool = False) -> Tuple[Matcher, int]:
+    """Print the header and match events for one capture; returns the matcher and linktype."""
+    reporter = new_reporter(out, options)
+    reporter.line(f"{GREEN}=== DNS Query/Response Analysis ==={NC}")
+    reporter.line(f"PCAP File: {pcap_file}")
+    reporter.line(f"Response Timeout: {options.timeout:g}s")
+    start = end = None
+    if options.timestamp is not None:
+        start, end = options.timestamp - options.span, options.timestamp + options.span
+        reporter.line(f"Time Filter: {options.timestamp:g} ±{options.span:g}s")
+    reporter.line()
+    reporter.line("Reading DNS packets and matching queries with responses...")
+    reporter.line()
+
+    matcher = Matcher(reporter, options.timeout, options.evict_after, keep, carry)
+    if options.latency:
+        matcher.latency = LatencyStats()
+    linktype = 1
+    stream, _ = open_input(pcap_file)
+    with stream as f:
+        for packet, is_response, linktype in iter_dns_packets(f, keep, start, end):
+            matcher.add(packet, is_response)
+    matcher.finish()
+    return matcher, linktype
+
+
+def report_file(pcap_file: str, stats: Stats, frames: List[Tuple[int, float, bytes]],
+                linktype: int, options: argparse.Namespace, output_file: Optional[str],
+                out: TextIO) -> None:
+    """Print the summary, write the unmatched packets and print the verdict."""
+    reporter = new_reporter(out, options)
+    print_summary(reporter, pcap_file, stats)
+
+    if output_file and frames:
+        reporter.line()
+        reporter.line("Creating PCAP file with unmatched packets...")
+        write_pcap(output_file, linktype, frames)
+        reporter.line(f"{GREEN}Successfully created PCAP file with {len(frames)} "
+                      f"unmatched packet(s): {output_file}{NC}")
+    elif output_file:
+        reporter.line()
+        reporter.line(f"{YELLOW}No unmatched packets found - PCAP file not created{NC}")
+
+    reporter.line()
+    if stats.unmatched:
+        reporter.line(f"{RED}WARNING: Found mismatches - {stats.missing_responses} missing response(s), "
+                      f"{stats.missing_queries} missing query(ies){NC}")
+    else:
+        reporter.line(f"{GREEN}SUCCESS: All DNS queries have matching responses{NC}")
+
+
+def analyze_file(pcap_file: str, options: argparse.Namespace, output_file: Optional[str],
+                 out: TextIO) -> Stats:
+    """Match one capture and print its report; returns its counters."""
+    matcher, linktype = match_file(pcap_file, options, out, keep=bool(output_file))
+    report_file(pcap_file, matcher.stats, matcher.unmatched_frames, linktype,
+                options, output_file, out)
+    if matcher.latency is not None:
+        finish_latency(matcher.latency, options)
+    return matcher.stats
+
+
+def match_worker(pcap_file: str, options: argparse.Namespace) -> FileResult:
+    """Batch worker: match one capture, buffering its report for the parent."""
+    out = io.StringIO()
+    matcher, linktype = match_file(pcap_file, options, out, keep=True, carry=True)
+    return FileResult(pcap_file, matcher, out.getvalue(), linktype)
+
+
+def carry_over(prev: Optional[FileResult], cur: Optional[FileResult],
+               options: argparse.Namespace) -> None:
+    """
+    Offer the queries prev left outstanding to the responses from the start
+    of cur, the next capture in time. Whatever is still unmatched afterwards
+    is reported in its own file, as if the files had been analysed alone.
+    """
+    prev_out, cur_out = io.StringIO(), io.StringIO()
+    queries = Matcher(new_reporter(prev_out, options), options.timeout, options.evict_after, True)
+    responses = Matcher(new_reporter(cur_out, options), options.timeout, options.evict_after, True)
+    if prev:
+        queries.stats = prev.stats
+        queries.latency = prev.latency
+        queries.resume(prev.leftover)
+    if cur:
+        responses.stats = cur.stats
+        for response in cur.early:
+            queries.advance(response.time)
+            if not queries.answer(response):
+                responses.orphan(response)
+    queries.finish()
+    if prev:
+        prev.text += prev_out.getvalue()
+        prev.unmatched_frames.extend(queries.unmatched_frames)
+        prev.leftover = []
+    if cur:
+        cur.text += cur_out.getvalue()
+        cur.unmatched_frames.extend(responses.unmatched_frames)
+        cur.early = []
+
+
+def first_timestamp(pcap_file: str) -> float:
+    """Time of the first record, used to put rotated captures in order."""
+    try:
+        stream, _ = open_input(pcap_file)
+        with stream as f:
+            for _, ts, _ in read_pcap_records(f):
+                return ts
+    except (OSError, ValueError, EOFError, struct.error):
+        pass
+    return float("inf")
+
+
+def map_files(files: List[str], options: argparse.Namespace) -> Iterator:
+    """Run match_worker over files with --jobs processes, yielding (path, result or error) in order."""
+    if options.jobs <= 1:
+        for pcap_file in files:
+            try:
+                yield pcap_file, match_worker(pcap_file, options)
+            except (OSError, ValueError, EOFError, struct.error) as e:
+                yield pcap_file, e
+        return
+
+    # Keep a bounded window of files in flight so finished reports do not
+    # pile up in memory while an earlier file is still being matched.
+    with ProcessPoolExecutor(max_workers=options.jobs) as pool:
+        pending = deque()
+        for pcap_file in files:
+            pending.append((pcap_file, pool.submit(match_worker, pcap_file, options)))
+            if len(pending) >= options.jobs * 2:
+                yield next_result(*pending.popleft())
+        while pending:
+            yield next_result(*pending.popleft())
+
+
+def next_result(pcap_file: str, future) -> Tuple[str, object]:
+    try:
+        return pcap_file, future.result()
+    except (OSError, ValueError, EOFError, struct.error) as e:
+        return pcap_file, e
+
+
+def print_summary(reporter: Reporter, pcap_file: str, stats: Stats) -> None:
+    if reporter.quiet:
+        if stats.unmatched:
+            reporter.out.write(f"{os.path.basename(pcap_file)}: FAILED - Missing responses: "
+                               f"{stats.missing_responses}, Missing queries: {stats.missing_queries}\n")
+        else:
+            reporter.out.write(f"{os.path.basename(pcap_file)}: OK\n")
+        return
+    reporter.line()
+    reporter.line(f"{GREEN}=== Summary ==={NC}")
+    reporter.line(f"Total Queries:        {stats.queries}")
+    reporter.line(f"Total Responses:      {stats.responses}")
+    reporter.line(f"Matched Pairs:        {GREEN}{stats.matched}{NC}")
+    reporter.line(f"Missing Responses:    {RED}{stats.missing_responses}{NC}")
+    reporter.line(f"Missing Queries:      {RED}{stats.missing_queries}{NC}")
+    if stats.timeout_exceeded:
+        reporter.line(f"Timeout Exceeded:     {YELLOW}{stats.timeout_exceeded}{NC}")
+    if stats.queries:
+        reporter.line(f"Match Rate:           {stats.matched * 100 / stats.queries:.2f}%")
+    if stats.rcodes:
+        reporter.line(f"Response RCODEs:      {rcode_text(stats)}")
+
+
+def rcode_text(stats: Stats) -> str:
+    return ", ".join(f"{name} {count}" for name, count in
+                     sorted(stats.rcodes.items(), key=lambda item: -item[1]))
+
+
+def batch_files(patterns: List[str]) -> List[str]:
+    """Expand -f arguments, or scan the script directory like the shell version."""
+    if not patterns:
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        return sorted(os.path.join(script_dir, name) for name in os.listdir(script_dir)
+                      if name.endswith(".pcap"))
+    files = []
+    for pattern in patterns:
+        matches = glob.glob(pattern) or [pattern]
+        for path in matches:
+            if os.path.isfile(path):
+                files.append(os.path.abspath(path))
+            else:
+                print(f"{YELLOW}Warning: File not found: {path}{NC}")
+    return sorted(files)
+
+
+def run_batch(options: argparse.Namespace) -> int:
+    """
+    Match the captures in a process pool (--jobs) and print their reports in
+    timestamp order. Each report is printed once the next capture has had a
+    chance to answer its last queries, so rotated files behave like one.
+    """
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    print(f"{BLUE}=== Batch DNS Analysis ==={NC}")
+    print(f"Directory: {script_dir}")
+    print()
+    print("Processing specified files..." if options.files else "Searching for PCAP files in directory...")
+    files = batch_files(options.files)
+    if not files:
+        print(f"{YELLOW}No PCAP files found{NC}")
+        return 0
+    print(f"Found {len(files)} PCAP file(s)")
+    print()
+    files.sort(key=lambda path: (first_timestamp(path), path))
+
+    results_dir = os.path.join(script_dir, "dns_analysis_results")
+    os.makedirs(results_dir, exist_ok=True)
+    counts = {"passed": 0, "failed": 0, "warnings": 0, "outputs": 0}
+    total = Stats()
+    latency = LatencyStats()
+
+    def heading(number: int, pcap_file: str) -> None:
+        print(f"{BLUE}[{number}/{len(files)}] Processing: {os.path.basename(pcap_file)}{NC}")
+        print("-------------------------------------------------------------------")
+
+    def finish(number: int, result: FileResult) -> None:
+        heading(number, result.path)
+        filename = os.path.basename(result.path)
+        batch_output = os.path.join(results_dir, f"{filename[:-5] if filename.endswith('.pcap') else filename}"
+                                                 f"_unmatched.pcap")
+        out = sys.stdout if options.verbose else open(os.devnull, 'w')
+        try:
+            out.write(result.text)
+            report_file(result.path, result.stats, result.unmatched_frames, result.linktype,
+                        options, batch_output, out)
+        finally:
+            if out is not sys.stdout:
+                out.close()
+        stats = result.stats
+        total.merge(stats)
+        if result.latency is not None:
+            latency.merge(result.latency)
+        created = os.path.isfile(batch_output)
+        counts["outputs"] += created
+        if options.verbose:
+            counts["passed"] += not stats.unmatched
+            counts["failed"] += bool(stats.unmatched)
+        elif not stats.unmatched and not stats.queries:
+            print(f"{YELLOW}WARNING: No packets found in specified time window{NC}")
+            counts["warnings"] += 1
+        elif not stats.unmatched:
+            counts["passed"] += 1
+            print(f"{GREEN}PASSED{NC}")
+        else:
+            counts["failed"] += 1
+            print(f"{RED}FAILED - See {batch_output}{NC}" if created else f"{RED}FAILED{NC}")
+        print()
+
+    prev = None
+    for number, (pcap_file, result) in enumerate(map_files(files, options), 1):
+        if isinstance(result, Exception):
+            if prev:
+                carry_over(prev, None, options)
+                finish(number - 1, prev)
+                prev = None
+            heading(number, pcap_file)
+            counts["failed"] += 1
+            print(f"{RED}FAILED ({result}){NC}")
+            print()
+            continue
+        carry_over(prev, result, options)
+        if prev:
+            finish(number - 1, prev)
+        prev = result
+    if prev:
+        carry_over(prev, None, options)
+        finish(len(files), prev)
+
+    print("===================================================================")
+    print(f"{BLUE}=== Final Summary ==={NC}")
+    print(f"Total files analyzed: {len(files)}")
+    print(f"Passed:               {GREEN}{counts['passed']}{NC}")
+    print(f"Failed:               {RED}{counts['failed']}{NC}")
+    if counts["warnings"]:
+        print(f"Warnings:             {YELLOW}{counts['warnings']}{NC}")
+    print(f"Queries/Responses:    {total.queries}/{total.responses} "
+          f"(missing responses: {total.missing_responses}, missing queries: {total.missing_queries})")
+    print(f"Matched Pairs:        {total.matched}")
+    if total.timeout_exceeded:
+        print(f"Timeout Exceeded:     {YELLOW}{total.timeout_exceeded}{NC}")
+    if total.queries:
+        print(f"Match Rate:           {total.matched * 100 / total.queries:.2f}%")
+    if total.rcodes:
+        print(f"Response RCODEs:      {rcode_text(total)}")
+    print()
+    if counts["outputs"]:
+        print(f"Results saved to: {results_dir}")
+    if options.latency:
+        finish_latency(latency, options)
+    return 1 if counts["failed"] else 0
+
+
+def finish_latency(latency: LatencyStats, options: argparse.Namespace) -> None:
+    """Fold in --latency-merge files, print the percentiles and save --latency-out."""
+    for path in options.latency_merge or ():
+        latency.merge(LatencyStats.load(path))
+    print_latency(latency, sys.stdout)
+    if options.latency_out:
+        latency.save(options.latency_out)
+        print(f"Latency histograms saved to: {options.latency_out}")
+
+
+def print_latency(latency: LatencyStats, out: TextIO) -> None:
+    def row(label: str, hist: LatencyHistogram) -> None:
+        ms = [hist.quantile(q) * 1000 for q in (0.5, 0.99, 0.999)]
+        out.write(f"{label:<40} {hist.count:>10} {ms[0]:>10.3f} {ms[1]:>10.3f} {ms[2]:>10.3f} "
+                  f"{hist.max / 1000:>10.3f}\n")
+
+    columns = f" {'Count':>10} {'p50':>10} {'p99':>10} {'p99.9':>10} {'max':>10}\n"
+    out.write("\n")
+    out.write(f"{GREEN}=== Response Latency (ms) ==={NC}\n")
+    out.write(f"{'Server':<40}{columns}")
+    for server, hist in sorted(latency.servers.items(), key=lambda item: -item[1].count):
+        row(server, hist)
+    out.write(f"{'QTYPE':<40}{columns}")
+    for qtype, hist in sorted(latency.qtypes.items(), key=lambda item: -item[1].count):
+        row(type_name(qtype), hist)
+    row("All", latency.all)
+
+
+def parse_timestamp(value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    value = value.strip()
+    utc = value.endswith(" UTC")
+    if utc:
+        value = value[:-4]
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S"):
+        try:
+            parsed = time.strptime(value, fmt)
+        except ValueError:
+            continue
+        return float(calendar.timegm(parsed) if utc else time.mktime(parsed))
+    raise argparse.ArgumentTypeError(
+        f"Unable to parse timestamp '{value}' (epoch, '2026-01-09 14:30:00', "
+        f"'2026-01-09T14:30:00' or '2026-01-09 14:30:00 UTC')")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Verify that every DNS query in a capture has a matching response "
+                    "(DNS over UDP and TCP port 53).",
+        epilog="Examples:\n"
+               "  %(prog)s dns_traffic.pcap -t 10 -v\n"
+               "  %(prog)s dns_traffic.pcap -T 1704812400 -s 5\n"
+               "  %(prog)s -f dns*.pcap -v\n"
+               "  %(prog)s -f rotated/*.pcap -j 8\n"
+               "  %(prog)s -f day1/*.pcap --latency-out host1.json\n"
+               "  %(prog)s --latency-merge host1.json host2.json",
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pcap_file", nargs="?", help="Capture to analyse (single file mode)")
+    parser.add_argument("-f", dest="files", nargs="*", metavar="FILE",
+                        help="Batch mode: one or more captures (default: *.pcap next to this script)")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="Batch mode: match files in N worker processes (default: 1)")
+    parser.add_argument("-t", "--timeout", type=float, default=5.0,
+                        help="Maximum time between query and response (default: 5)")
+    parser.add_argument("--evict-after", type=float, metavar="SECONDS",
+                        help="Give up on an unanswered query after this long (default: 2 * timeout)")
+    parser.add_argument("-v", "--verbose", action="count", default=0,
+                        help="Show detailed output (-vvv accepted for compatibility)")
+    parser.add_argument("-q", "--quiet", action="store_true",
+                        help="Only show a brief summary (exit 0=success, 128=failure)")
+    parser.add_argument("-l", "--local-time", action="store_true",
+                        help="Display timestamps in local timezone (default: UTC)")
+    parser.add_argument("-T", "--timestamp", type=parse_timestamp,
+                        help="Only packets around this time (epoch or ISO 8601)")
+    parser.add_argument("-s", "--span", type=float, default=2.0,
+                        help="Seconds before/after --timestamp to include (default: 2)")
+    parser.add_argument("-o", "--output", metavar="FILE",
+                        help="Save unmatched packets to a pcap file (single mode)")
+    parser.add_argument("--latency", action="store_true",
+                        help="Report p50/p99/p99.9 response time per server and QTYPE")
+    parser.add_argument("--latency-out", metavar="FILE",
+                        help="Save the latency histograms as JSON (implies --latency)")
+    parser.add_argument("--latency-merge", nargs="+", metavar="FILE",
+                        help="Merge histograms saved by --latency-out, from other runs or hosts "
+                             "(implies --latency; no capture needed)")
+    options = parser.parse_args()
+
+    if options.timeout < 0:
+        parser.error("timeout must be a valid number")
+    if options.evict_after is None:
+        options.evict_after = options.timeout * 2
+    options.evict_after = max(options.evict_after, options.timeout, WHEEL_RESOLUTION)
+    options.latency = bool(options.latency or options.latency_out or options.latency_merge)
+
+    try:
+        if options.files is not None:
+            if options.pcap_file:
+                options.files.insert(0, options.pcap_file)
+            sys.exit(run_batch(options))
+        if not options.pcap_file and options.latency_merge:
+            finish_latency(LatencyStats(), options)
+            sys.exit(0)
+        if not options.pcap_file:
+            parser.error("No PCAP file specified")
+        if not os.path.isfile(options.pcap_file):
+            print(f"{RED}Error: PCAP file '{options.pcap_file}' not found{NC}")
+            sys.exit(1)
+        stats = analyze_file(options.pcap_file, options, options.output, sys.stdout)
+        sys.exit(128 if stats.unmatched else 0)
+    except KeyboardInterrupt:
+        sys.exit(130)
+
+
+if __name__ == "__main__":
+    main()
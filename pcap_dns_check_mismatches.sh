@@ -4,6 +4,8 @@
 # This script analyzes DNS traffic in PCAP files to verify that every query has a matching response
 # Matching is done by DNS transaction ID and IP/port combinations
 # Supports both single-file and batch processing modes
+# pcap_dns_check_mismatches.py takes the same options and matches in a single
+# pass over each capture without tshark
 
 set -euo pipefail
 
@@ -8,23 +8,57 @@
 import os
 import sys
 import csv
+import errno
+import json
+import math
+import mmap
 import psutil
+import resource
+import struct
+import subprocess
+from itertools import combinations
 if os.name != 'posix':
         sys.exit('platform not supported')
 import time
+from collections import namedtuple
 from datetime import datetime, timedelta
+from io import FileIO
+from operator import itemgetter
 from optparse import OptionParser
 
-now = int(time.time())
+def monotonic_clock():
+    """
+    time.monotonic() is Python 3 only; on 2.7 call clock_gettime(CLOCK_MONOTONIC)
+    through ctypes, falling back to os.times()[4] (elapsed time since boot
+    on Linux, in clock ticks) where libc lacks it.
+    """
+    if hasattr(time, 'monotonic'):
+        return time.monotonic
+    try:
+        import ctypes
+        import ctypes.util
+
+        class timespec(ctypes.Structure):
+            _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        clock_gettime = libc.clock_gettime
+        clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(timespec)]
+        CLOCK_MONOTONIC = 4 if sys.platform == 'darwin' else 6 if sys.platform.startswith('freebsd') else 1
+        ts = timespec()
+
+        def monotonic():
+            if clock_gettime(CLOCK_MONOTONIC, ctypes.byref(ts)):
+                e = ctypes.get_errno()
+                raise OSError(e, os.strerror(e))
+            return ts.tv_sec + ts.tv_nsec * 1e-9
+        monotonic()
+        return monotonic
+    except (OSError, AttributeError):
+        return lambda: os.times()[4]
+
+monotonic = monotonic_clock()
 
-def is_empty(any_structure):
-    if any_structure:
-        #print('Structure is not empty.')
-        return False
-    else:
-        #print('Structure is empty.')
-        return True
-    
 def query_yes_no(question, default="yes"):
     """Ask a yes/no question via raw_input() and return their answer.
 
@@ -75,103 +109,952 @@ def bytes2human(n):
             return '%s%s' % (value, s)
     return "%sB" % n
 
-def poll(interval, pname, csvfile):
-    # sleep some time
-    time.sleep(interval)
-    procs = []
-    procs_status = {}
-    for p in psutil.process_iter():
-        if p.name() == pname :
+FIELDS = ['nice', 'memory_info', 'memory_percent', 'cpu_percent', 'cpu_times', 'name', 'status', 'pid']
+
+class ProcessTracker(object):
+    """
+    Keeps the psutil.Process objects of the processes called pname between
+    ticks (which cpu_percent() needs anyway) and only walks the whole
+    process table every `rescan` seconds to pick up new ones. Also measures
+    how much CPU the sampler itself burns per tick.
+    """
+
+    def __init__(self, pname, rescan=5.0):
+        self.pname = pname
+        self.rescan_interval = rescan
+        self.procs = {}
+        self.next_rescan = 0
+        self.ticks = 0
+        self.cpu_total = 0.0
+        self.cpu_max = 0.0
+        self.cpu_last = 0.0
+
+    def rescan(self):
+        for p in psutil.process_iter(['name']):
+            if p.info['name'] == self.pname and p.pid not in self.procs:
+                self.procs[p.pid] = p
+
+    def collect(self, p):
+        with p.oneshot():
+            d = p.as_dict(FIELDS)
+        if d['name'] != self.pname:
+            # Renamed, or the PID now belongs to something else
+            return None
+        return d
+
+    def sample(self):
+        # getrusage() has microsecond resolution; /proc cpu times only 10ms
+        start = resource.getrusage(resource.RUSAGE_SELF)
+        if monotonic() >= self.next_rescan:
+            self.rescan()
+            self.next_rescan = monotonic() + self.rescan_interval
+        procs = []
+        procs_status = {}
+        for pid, p in list(self.procs.items()):
             try:
-                p.dict = p.as_dict(['nice', 'memory_info','memory_percent', 'cpu_percent', 'cpu_times', 'name', 'status', 'pid'])
-                try:
-                    procs_status[p.dict['status']] += 1
-                except KeyError:
-                    procs_status[p.dict['status']] = 1
+                p.dict = self.collect(p)
             except psutil.NoSuchProcess:
-                pass
+                p.dict = None
+            if p.dict is None:
+                del self.procs[pid]
+                continue
+            try:
+                procs_status[p.dict['status']] += 1
+            except KeyError:
+                procs_status[p.dict['status']] = 1
+            procs.append(p)
+        end = resource.getrusage(resource.RUSAGE_SELF)
+        self.cpu_last = (end.ru_utime - start.ru_utime) + (end.ru_stime - start.ru_stime)
+        self.cpu_total += self.cpu_last
+        self.cpu_max = max(self.cpu_max, self.cpu_last)
+        self.ticks += 1
+        # return processes sorted by PID
+        return sorted(procs, key=lambda p: p.dict['pid']), procs_status
+
+    def report(self):
+        if self.ticks:
+            return "Sampler CPU per tick: avg %.2f ms, max %.2f ms over %d ticks" % (
+                self.cpu_total * 1000 / self.ticks, self.cpu_max * 1000, self.ticks)
+        return "Sampler CPU per tick: no ticks"
+
+# Linux fast path: the same FIELDS as ProcessTracker, parsed straight from
+# /proc/<pid>/stat and statm through descriptors that stay open between ticks.
+pmem = namedtuple('pmem', 'rss vms shared text lib data dirty')
+pcputimes = namedtuple('pcputimes', 'user system children_user children_system iowait')
+# state, utime, stime, cutime, cstime, nice, delayacct_blkio_ticks: fields
+# 3, 14-17, 19 and 42 of stat, counted from the first one after "(comm)"
+STAT_FIELDS = itemgetter(0, 11, 12, 13, 14, 16, 39)
+PROC_STATUSES = {
+        b"R": psutil.STATUS_RUNNING,
+        b"S": psutil.STATUS_SLEEPING,
+        b"D": psutil.STATUS_DISK_SLEEP,
+        b"T": psutil.STATUS_STOPPED,
+        b"t": psutil.STATUS_TRACING_STOP,
+        b"Z": psutil.STATUS_ZOMBIE,
+        b"X": psutil.STATUS_DEAD,
+        b"x": psutil.STATUS_DEAD,
+        b"K": "wake-kill",
+        b"W": psutil.STATUS_WAKING,
+        b"I": psutil.STATUS_IDLE,
+        b"P": psutil.STATUS_PARKED,
+}
+
+class ProcfsProcess(object):
+    """
+    A PID read through its own /proc/<pid>/stat and statm descriptors. They
+    stay bound to that process: once it is gone reads fail with ESRCH, even
+    if the PID has been given to something else in the meantime.
+    """
+    __slots__ = ('pid', 'dict', 'stat', 'statm', 'cpu_last', 'time_last')
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.dict = None
+        self.stat = FileIO('/proc/%d/stat' % pid)
+        try:
+            self.statm = FileIO('/proc/%d/statm' % pid)
+        except (IOError, OSError):
+            self.stat.close()
+            raise
+        self.cpu_last = None
+        self.time_last = None
+
+    def close(self):
+        self.stat.close()
+        self.statm.close()
+
+class ProcfsTracker(ProcessTracker):
+    """ProcessTracker that reads /proc itself instead of going through psutil.Process on every tick."""
+
+    def __init__(self, pname, rescan=5.0):
+        ProcessTracker.__init__(self, pname, rescan)
+        # /proc/<pid>/stat truncates the name to 15 characters
+        self.comm = bytearray(pname[:15].encode('utf-8'))
+        self.buf = bytearray(4096)
+        self.clock_ticks = float(os.sysconf('SC_CLK_TCK'))
+        self.pagesize = resource.getpagesize()
+        self.total_memory = psutil.virtual_memory().total
+        # Two descriptors per process
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if hard == resource.RLIM_INFINITY or hard > 65536:
+            hard = 65536
+        if soft < hard:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    def rescan(self):
+        for p in psutil.process_iter(['name']):
+            if p.info['name'] == self.pname and p.pid not in self.procs:
+                try:
+                    self.procs[p.pid] = ProcfsProcess(p.pid)
+                except (IOError, OSError) as e:
+                    if e.errno not in (errno.ENOENT, errno.ESRCH):
+                        raise
+
+    def collect(self, p):
+        buf = self.buf
+        try:
+            p.stat.seek(0)
+            n = p.stat.readinto(buf)
+            stat = buf[:n]
+            p.statm.seek(0)
+            n = p.statm.readinto(buf)
+            statm = buf[:n].split()
+        except (IOError, OSError) as e:
+            if e.errno != errno.ESRCH:
+                raise
+            p.close()
+            return None
+        now = monotonic()
+        end = stat.rfind(b")")
+        if stat[stat.find(b"(") + 1:end] != self.comm:
+            p.close()
+            return None
+        state, utime, stime, cutime, cstime, nice, blkio = STAT_FIELDS(stat[end + 2:].split())
+        ticks = self.clock_ticks
+        cpu_times = pcputimes(int(utime) / ticks, int(stime) / ticks, int(cutime) / ticks,
+                              int(cstime) / ticks, int(blkio) / ticks)
+        cpu = cpu_times.user + cpu_times.system
+        # Same as psutil's cpu_percent(): 0.0 the first time, then usage since the previous call
+        if p.cpu_last is None or now <= p.time_last:
+            cpu_percent = 0.0
+        else:
+            cpu_percent = round((cpu - p.cpu_last) * 100 / (now - p.time_last), 1)
+        p.cpu_last = cpu
+        p.time_last = now
+        page = self.pagesize
+        size, resident, shared, text, lib, data, dirty = statm
+        mem = pmem(int(resident) * page, int(size) * page, int(shared) * page, int(text) * page,
+                   int(lib) * page, int(data) * page, int(dirty) * page)
+        return {
+                'nice': int(nice),
+                'memory_info': mem,
+                'memory_percent': mem.rss * 100.0 / self.total_memory,
+                'cpu_percent': cpu_percent,
+                'cpu_times': cpu_times,
+                'name': self.pname,
+                'status': PROC_STATUSES.get(bytes(state), '?'),
+                'pid': p.pid,
+        }
+
+def collector_benchmark(pname, ticks):
+    """Sample the processes called pname ticks times with both collectors, back to back, and print the cost."""
+    collectors = [("psutil", ProcessTracker)]
+    if sys.platform.startswith('linux'):
+        collectors.append(("procfs", ProcfsTracker))
+    for label, tracker_class in collectors:
+        tracker = tracker_class(pname, 3600)
+        procs, procs_status = tracker.sample()
+        tracker.ticks = tracker.cpu_total = tracker.cpu_max = 0
+        count = 0
+        start = monotonic()
+        for i in range(ticks):
+            procs, procs_status = tracker.sample()
+            count += len(procs)
+        wall = monotonic() - start
+        print "%-7s %d processes: %.3f ms wall, %.3f ms CPU per sample, %.1f us CPU per process" % (
+            label, count // ticks if ticks else 0, wall * 1000 / ticks, tracker.cpu_total * 1000 / ticks,
+            tracker.cpu_total * 1e6 / count if count else 0)
+
+TREE_FIELDS = ['name', 'ppid', 'status', 'cpu_times', 'cpu_percent', 'memory_full_info',
+               'io_counters', 'num_ctx_switches', 'threads']
+
+class TreeTracker(ProcessTracker):
+    """
+    Follows a root PID and all of its descendants instead of processes
+    with a given name. Children started later are picked up on the next
+    rescan; exited ones drop out when they can no longer be read. Besides
+    the usual figures it collects USS, IO bytes, context switches and the
+    CPU usage of every thread since the previous tick.
+    """
+
+    def __init__(self, root_pid, rescan=1.0):
+        ProcessTracker.__init__(self, None, rescan)
+        self.root = psutil.Process(root_pid)
+        self.procs[self.root.pid] = self.root
+        self.total_memory = psutil.virtual_memory().total
+        self.last_tick = None
+        self.interval = None
+        self.thread_times = {}      # (pid, tid) -> CPU seconds at the previous tick
+        self.seen_threads = {}
+
+    def rescan(self):
+        try:
+            children = self.root.children(recursive=True)
+        except psutil.NoSuchProcess:
+            # Orphaned descendants get reparented; keep what we already follow
+            return
+        for p in children:
+            if p.pid not in self.procs:
+                self.procs[p.pid] = p
+
+    def collect(self, p):
+        with p.oneshot():
+            if not p.is_running():
+                # PID reused by an unrelated process
+                return None
+            d = p.as_dict(TREE_FIELDS)
+        d['pid'] = p.pid
+        mem = d['memory_full_info']
+        d['memory_info'] = mem
+        d['memory_percent'] = mem.rss * 100.0 / self.total_memory if mem is not None else None
+        threads = []
+        for t in d['threads'] or ():
+            used = t.user_time + t.system_time
+            prev = self.thread_times.get((p.pid, t.id))
+            self.seen_threads[(p.pid, t.id)] = used
+            if prev is not None and self.interval:
+                percent = round((used - prev) * 100 / self.interval, 1)
             else:
-                procs.append(p)
-        elif pname == "header":
-            return ([], {}, csvfile)
-    # return processes sorted by PID
-    processes = sorted(procs, key=lambda p: p.dict['pid'], reverse=False)
-    return (processes, procs_status, csvfile)
+                percent = None
+            threads.append((t.id, t.user_time, t.system_time, percent))
+        d['thread_cpu'] = threads
+        return d
+
+    def sample(self):
+        now = monotonic()
+        if self.last_tick is not None:
+            self.interval = now - self.last_tick
+        self.last_tick = now
+        self.seen_threads = {}
+        result = ProcessTracker.sample(self)
+        self.thread_times = self.seen_threads
+        return result
+
+class Scheduler(object):
+    """
+    Fixed-rate ticks against a monotonic clock: tick k is due at
+    start + k * interval, so sleep jitter and sampling time do not add up
+    to drift. Ticks that are already over by the time we wake up (the
+    sampler took longer than the interval) are skipped and counted.
+    """
+
+    POLL_SLICE = 0.01
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.start = monotonic()
+        self.tick = 0
+        self.missed = 0
+
+    def wait(self, stop=None):
+        """
+        Sleep until the next tick; returns how many ticks were missed before it.
+        With stop, it is polled every POLL_SLICE seconds while sleeping and
+        a true result returns None right away.
+        """
+        self.tick += 1
+        now = monotonic()
+        due = self.start + self.tick * self.interval
+        missed = 0
+        if now > due + self.interval:
+            missed = int((now - due) / self.interval)
+            self.tick += missed
+            self.missed += missed
+            due = self.start + self.tick * self.interval
+        # Never sleep past one interval, whatever the clock did
+        due = min(due, now + self.interval)
+        if stop is None:
+            if due > now:
+                time.sleep(due - now)
+            return missed
+        while due > now:
+            if stop():
+                return None
+            time.sleep(max(0, min(due - now, self.POLL_SLICE)))
+            now = monotonic()
+        return missed
+
+    def elapsed(self):
+        elapsed = self.tick * self.interval
+        if float(self.interval).is_integer():
+            return int(elapsed)
+        return round(elapsed, 3)
+
+class CsvOutput(object):
+    """CSV file kept open for the whole run; rows are written in batches every flush_every seconds."""
+
+    def __init__(self, csvfile, flush_every=2.0):
+        self.f = open(csvfile, 'ab')
+        self.writer = csv.writer(self.f)
+        self.rows = []
+        self.flush_every = flush_every
+        self.last_flush = monotonic()
+
+    def write(self, row):
+        self.rows.append(row)
+        if monotonic() - self.last_flush >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        self.writer.writerows(self.rows)
+        self.f.flush()
+        del self.rows[:]
+        self.last_flush = monotonic()
+
+    def close(self):
+        self.flush()
+        self.f.close()
+
+# Binary recordings (-b): a 96-byte header followed by one frame per tick:
+# a TICK (time, process count) and then a RECORD per process, with counters
+# in pages and centiseconds so a record is 32 bytes. Frames are appended, or,
+# with --retention, written through mmap into a preallocated ring of
+# `capacity` bytes that overwrites the oldest frames.
+TICK = struct.Struct("<dH")     # time.time() of the sample, processes in it
+RECORD_FIELDS = (
+        ("pid", "I"),
+        ("cpu_user", "I"),          # centiseconds, NA when not available
+        ("cpu_system", "I"),
+        ("vms", "I"),               # pages
+        ("rss", "I"),
+        ("shared", "I"),
+        ("text", "I"),
+        ("cpu_percent", "H"),       # tenths of a percent, NA16 when not available
+        ("mem_percent", "H"),       # hundredths of a percent
+)
+RECORD = struct.Struct("<" + "".join(code for name, code in RECORD_FIELDS))
+NA = 0xFFFFFFFF
+NA16 = 0xFFFF
+WRAP = 0xFFFF                   # TICK count of a frame that continues at the start of the ring
+# Columns --convert writes, in the units of the CSV output
+SAMPLE_FIELDS = (
+        ("time", "f8"),
+        ("pid", "u4"),
+        ("cpu_user", "f8"),         # CPU seconds
+        ("cpu_system", "f8"),
+        ("vms", "u8"),              # bytes
+        ("rss", "u8"),
+        ("shared", "u8"),
+        ("text", "u8"),
+        ("cpu_percent", "f4"),      # NaN when not available
+        ("mem_percent", "f4"),
+)
+# magic, version, record size, page size, ring capacity in bytes (0: append-only),
+# frames written, frames in the ring, ring head and tail offsets, start time, process name
+BIN_HEADER = struct.Struct("<4sHHIQQQQQd36s")
+BIN_MAGIC = b"PSBR"
+BIN_VERSION = 2
+PAGE_SIZE = resource.getpagesize()
+NAN = float("nan")
+
+def ring_capacity(seconds, interval, max_procs):
+    """Bytes of ring that hold seconds of ticks with up to max_procs processes each."""
+    # One spare frame for the gap a wrap can leave at the end of the ring
+    return int(-(-seconds // interval) + 1) * (TICK.size + max_procs * RECORD.size)
+
+def scaled(value, scale, na=NA):
+    if value is None:
+        return na
+    return min(int(round(value * scale)), na - 1)
+
+class BinaryOutput(object):
+    """Writes one frame per tick; capacity > 0 makes the file a ring buffer of that many bytes."""
+
+    def __init__(self, path, pname, capacity=0, flush_every=2.0):
+        self.capacity = capacity
+        self.flush_every = flush_every
+        self.last_flush = monotonic()
+        self.written = self.live = self.head = self.tail = 0
+        exists = os.path.isfile(path) and os.path.getsize(path) >= BIN_HEADER.size
+        if exists:
+            header = read_header(path)
+            if header[4] != capacity:
+                raise ValueError("%s was recorded with a different --retention/--max-procs" % path)
+            self.written, self.live, self.head, self.tail = header[5:9]
+        header = BIN_HEADER.pack(BIN_MAGIC, BIN_VERSION, RECORD.size, PAGE_SIZE, capacity,
+                                 0, 0, 0, 0, time.time(), pname.encode('utf-8')[:36])
+        if capacity:
+            self.f = open(path, 'r+b' if exists else 'w+b')
+            if not exists:
+                self.f.write(header)
+                self.f.truncate(BIN_HEADER.size + capacity)
+            self.map = mmap.mmap(self.f.fileno(), 0)
+        else:
+            self.f = open(path, 'ab')
+            if not exists:
+                self.f.write(header)
+            self.frames = []
+
+    def write(self, procs):
+        if self.capacity:
+            # A tick with more processes than the ring was sized for keeps the first ones
+            procs = procs[:(self.capacity - TICK.size) // RECORD.size]
+        records = [TICK.pack(time.time(), len(procs))]
+        for p in procs:
+            d = p.dict
+            cpu = d['cpu_times']
+            mem = d['memory_info']
+            records.append(RECORD.pack(p.pid,
+                                       scaled(cpu and cpu.user, 100), scaled(cpu and cpu.system, 100),
+                                       scaled(getattr(mem, 'vms', 0), 1.0 / PAGE_SIZE),
+                                       scaled(getattr(mem, 'rss', 0), 1.0 / PAGE_SIZE),
+                                       scaled(getattr(mem, 'shared', 0), 1.0 / PAGE_SIZE),
+                                       scaled(getattr(mem, 'text', 0), 1.0 / PAGE_SIZE),
+                                       scaled(d['cpu_percent'], 10, NA16),
+                                       scaled(d['memory_percent'], 100, NA16)))
+        frame = b"".join(records)
+        if self.capacity:
+            self.put(frame)
+            # written, live, head and tail, right after magic/version/sizes/capacity
+            struct.pack_into("<QQQQ", self.map, 20, self.written, self.live, self.head, self.tail)
+        else:
+            self.frames.append(frame)
+            self.written += 1
+        if monotonic() - self.last_flush >= self.flush_every:
+            self.flush()
+
+    def put(self, frame):
+        """Store frame at the ring head, dropping the oldest frames it overlaps."""
+        size = len(frame)
+        if self.head + size > self.capacity:
+            self.evict(self.capacity)
+            if self.capacity - self.head >= TICK.size:
+                self.map[BIN_HEADER.size + self.head:BIN_HEADER.size + self.head + TICK.size] = \
+                    TICK.pack(0.0, WRAP)
+            self.head = 0
+        self.evict(self.head + size)
+        if not self.live:
+            self.tail = self.head
+        pos = BIN_HEADER.size + self.head
+        self.map[pos:pos + size] = frame
+        self.head += size
+        self.written += 1
+        self.live += 1
+
+    def evict(self, end):
+        # The live frames run from tail to head, wrapping; drop those that start in [head, end)
+        while self.live and self.head <= self.tail < end:
+            self.live -= 1
+            if not self.live:
+                self.tail = self.head
+                break
+            after = next_frame(self.map, BIN_HEADER.size, self.capacity, self.tail)[1]
+            # Keep tail on the start of a frame, past any wrap marker
+            self.tail = next_frame(self.map, BIN_HEADER.size, self.capacity, after)[0]
+
+    def flush(self):
+        if self.capacity:
+            self.map.flush()
+        else:
+            self.f.write(b"".join(self.frames))
+            self.f.flush()
+            del self.frames[:]
+        self.last_flush = monotonic()
 
+    def close(self):
+        self.flush()
+        if self.capacity:
+            self.map.close()
+        self.f.close()
 
-def writecsv(procs, procs_status,csvfile):
-    # If procs is not set, it must be a header
-    if is_empty(procs):
+def next_frame(data, base, capacity, pos):
+    """Return (offset of the frame at or wrapped from pos, offset after it) in a ring."""
+    if capacity - pos < TICK.size or TICK.unpack_from(data, base + pos)[1] == WRAP:
+        pos = 0
+    count = TICK.unpack_from(data, base + pos)[1]
+    return pos, pos + TICK.size + count * RECORD.size
+
+def read_header(path):
+    with open(path, 'rb') as f:
+        header = BIN_HEADER.unpack(f.read(BIN_HEADER.size))
+    if header[0] != BIN_MAGIC or header[1] != BIN_VERSION or header[2] != RECORD.size:
+        raise ValueError("%s is not a recording of this version" % path)
+    return header
+
+def read_samples(path):
+    """Return (process name, samples oldest first as SAMPLE_FIELDS tuples) of a recording."""
+    header = read_header(path)
+    page_size, capacity, live, tail = header[3], header[4], header[6], header[8]
+    with open(path, 'rb') as f:
+        f.seek(BIN_HEADER.size)
+        data = f.read()
+    if capacity:
+        frames = []
+        pos = tail
+        for i in range(live):
+            pos, end = next_frame(data, 0, capacity, pos)
+            frames.append(pos)
+            pos = end
+    else:
+        frames = []
+        pos = 0
+        while pos + TICK.size <= len(data):
+            end = pos + TICK.size + TICK.unpack_from(data, pos)[1] * RECORD.size
+            if end > len(data):
+                # A partial frame from an interrupted write
+                break
+            frames.append(pos)
+            pos = end
+    samples = []
+    for pos in frames:
+        ts, count = TICK.unpack_from(data, pos)
+        for i in range(count):
+            (pid, user, system, vms, rss, shared, text, cpu_percent,
+             mem_percent) = RECORD.unpack_from(data, pos + TICK.size + i * RECORD.size)
+            samples.append((ts, pid,
+                            user / 100.0 if user != NA else NAN,
+                            system / 100.0 if system != NA else NAN,
+                            vms * page_size, rss * page_size, shared * page_size, text * page_size,
+                            cpu_percent / 10.0 if cpu_percent != NA16 else NAN,
+                            mem_percent / 100.0 if mem_percent != NA16 else NAN))
+    return header[10].rstrip(b"\0").decode('utf-8'), samples
+
+def convert(path, fmt, output):
+    pname, samples = read_samples(path)
+    if fmt == "npy":
+        import numpy
+        dtype = numpy.dtype([(name, "<" + code) for name, code in SAMPLE_FIELDS])
+        numpy.save(output, numpy.array(samples, dtype=dtype))
+    else:
+        with open(output, 'wb') as f:
+            writer = csv.writer(f)
+            writer.writerow(("proc",) + tuple(name for name, code in SAMPLE_FIELDS))
+            for sample in samples:
+                writer.writerow((pname,) + tuple(repr(v) if isinstance(v, float) else v
+                                                 for v in sample))
+    return len(samples)
+
+HEADER = (
+        "num",
+        "proc",
+        "pid",
+        "ctime",
+        #"nice",
+        "vms",
+        "rss",
+        "shared",
+        "text",
+        "cpu%",
+        "mem%"
+)
+
+def writeheader(out):
+    if out is not None:
+        out.write(HEADER)
+    else:
+        print HEADER
+
+def writecsv(procs, procs_status, out, num):
+    for p in procs:
+        if p.dict['cpu_times'] is not None:
+            ctime = timedelta(seconds=sum(p.dict['cpu_times']))
+            ctime = "%s:%s.%s" % (ctime.seconds // 60 % 60,
+            str((ctime.seconds % 60)).zfill(2),
+            str(ctime.microseconds)[:2])
+        else:
+            ctime = ''
+        if p.dict['memory_percent'] is not None:
+            p.dict['memory_percent'] = round(p.dict['memory_percent'], 1)
+        else:
+            p.dict['memory_percent'] = ''
+        if p.dict['cpu_percent'] is None:
+            p.dict['cpu_percent'] = ''
         line = (
-                "num",
-                "proc",
-                "pid",
-                "ctime",
-                #"nice",
-                "vms",
-                "rss",
-                "shared",
-                "text",
-                "cpu%",
-                "mem%"
+                num,                                                       # Seconds since start
+                p.dict['name'] or '',                                      # Name of the process
+                p.pid,                                                     # PID
+                ctime,                                                     # CPU Time
+                # p.dict['nice'],		                           ## Nice status
+                bytes2human(getattr(p.dict['memory_info'], 'vms', 0)),     # Virtual memory
+                bytes2human(getattr(p.dict['memory_info'], 'rss', 0)),     # RSS Memory
+                bytes2human(getattr(p.dict['memory_info'], 'shared', 0)),  # Shared Memory
+                bytes2human(getattr(p.dict['memory_info'], 'text', 0)),    # Text memory
+                p.dict['cpu_percent'],		                           # CPU usage
+                p.dict['memory_percent'],	                           # Memory usage
         )
-        if csvfile != "__no_output_just_verbose":
-            with open(csvfile, 'a') as f:
-                writer = csv.writer(f)
-                writer.writerows([line])
-            f.close
+        if out is not None:
+            out.write(line)
         else:
             print line
-    # Normal data
-    else:
-        for p in procs:
-            if p.dict['cpu_times'] is not None:
-                ctime = timedelta(seconds=sum(p.dict['cpu_times']))
-                ctime = "%s:%s.%s" % (ctime.seconds // 60 % 60,
-                str((ctime.seconds % 60)).zfill(2),
-                str(ctime.microseconds)[:2])
-            else:
-                ctime = ''
-            if p.dict['memory_percent'] is not None:
-                p.dict['memory_percent'] = round(p.dict['memory_percent'], 1)
-            else:
-                p.dict['memory_percent'] = ''
-            if p.dict['cpu_percent'] is None:
-                p.dict['cpu_percent'] = ''
-            line = (
-                    int(time.time()) - now,                                    # Iteration number
-                    p.dict['name'] or '',                                      # Name of the process
-                    p.pid,                                                     # PID
-                    ctime,                                                     # CPU Time
-                    # p.dict['nice'],		                               ## Nice status
-                    bytes2human(getattr(p.dict['memory_info'], 'vms', 0)),     # Virtual memory
-                    bytes2human(getattr(p.dict['memory_info'], 'rss', 0)),     # RSS Memory
-                    bytes2human(getattr(p.dict['memory_info'], 'shared', 0)),  # Shared Memory
-                    bytes2human(getattr(p.dict['memory_info'], 'text', 0)),    # Text memory
-                    p.dict['cpu_percent'],		                       # CPU usage
-                    p.dict['memory_percent'],	                               # Memory usage
-            )
-            if csvfile != "__no_output_just_verbose":
-                with open(csvfile, 'ab') as f:
-                    writer = csv.writer(f)
-                    writer.writerows([line])
-                f.close
-            else:
-                print line
+
+
+TREE_HEADER = (
+        "num",
+        "kind",             # proc, thread or total
+        "pid",
+        "tid",
+        "ppid",
+        "proc",
+        "cpu%",
+        "user",
+        "system",
+        "rss",
+        "uss",
+        "read",
+        "written",
+        "ctx_vol",
+        "ctx_invol",
+        "threads"
+)
+
+def writetree(procs, out, num):
+    """Rows for every process of the tree and its threads, then one row with the totals."""
+    rows = []
+    total = [0.0, 0.0, 0.0, 0, 0, 0, 0, 0, 0, 0]
+    for p in procs:
+        d = p.dict
+        cpu = d['cpu_times']
+        mem = d['memory_full_info']
+        io = d['io_counters']
+        ctx = d['num_ctx_switches']
+        values = [
+                d['cpu_percent'],
+                cpu.user if cpu is not None else None,
+                cpu.system if cpu is not None else None,
+                getattr(mem, 'rss', None),
+                getattr(mem, 'uss', None),
+                getattr(io, 'read_bytes', None),
+                getattr(io, 'write_bytes', None),
+                getattr(ctx, 'voluntary', None),
+                getattr(ctx, 'involuntary', None),
+                len(d['thread_cpu']),
+        ]
+        for i, v in enumerate(values):
+            if v is not None:
+                total[i] += v
+        rows.append((num, "proc", p.pid, '', d['ppid'] or '', d['name'] or '',
+                     values[0] if values[0] is not None else '',
+                     round(values[1], 2) if values[1] is not None else '',
+                     round(values[2], 2) if values[2] is not None else '')
+                    + tuple(bytes2human(v) if v is not None else '' for v in values[3:7])
+                    + tuple(v if v is not None else '' for v in values[7:]))
+        for tid, user, system, percent in d['thread_cpu']:
+            rows.append((num, "thread", p.pid, tid, '', '',
+                         percent if percent is not None else '',
+                         round(user, 2), round(system, 2)) + ('',) * 7)
+    rows.append((num, "total", '', '', '', len(procs),
+                 round(total[0], 1), round(total[1], 2), round(total[2], 2))
+                + tuple(bytes2human(v) for v in total[3:7]) + tuple(total[7:]))
+    for line in rows:
+        if out is not None:
+            out.write(line)
+        else:
+            print line
+
+
+# Benchmark mode (--runs): launch a command, sample its process tree until it
+# exits and summarise every run. A saved baseline holds the per-run summaries
+# so that a later build can be compared run by run.
+RUN_METRICS = (
+        # key, label, unit
+        ("wall", "Wall time", "s"),
+        ("cpu_time", "CPU time", "s"),
+        ("cpu_p50", "CPU% p50", "%"),
+        ("cpu_p95", "CPU% p95", "%"),
+        ("rss_p50", "RSS p50", "B"),
+        ("rss_max", "RSS max", "B"),
+)
+
+def percentile(values, pct):
+    """Nearest-rank percentile of values; None for an empty list."""
+    if not values:
+        return None
+    values = sorted(values)
+    rank = int(-(-pct * len(values) // 100)) - 1
+    return values[max(rank, 0)]
+
+def run_once(cmd, interval):
+    """Run cmd under a TreeTracker; return its summary and the samples of CPU% and RSS of the whole tree."""
+    start = monotonic()
+    child = subprocess.Popen(cmd)
+    tracker = TreeTracker(child.pid, interval)
+    scheduler = Scheduler(interval)
+    cpu_samples = []
+    rss_samples = []
+    reaped = []
+
+    def reap():
+        # The exit is timestamped here, not at the next tick
+        pid, status, usage = os.wait4(child.pid, os.WNOHANG)
+        if pid:
+            reaped.append((monotonic(), status, usage))
+        return pid
+
+    while not reap():
+        procs, procs_status = tracker.sample()
+        if procs and scheduler.tick:
+            # The first cpu_percent() of every process is always 0.0
+            cpu_samples.append(sum(p.dict['cpu_percent'] or 0.0 for p in procs))
+            rss_samples.append(sum(getattr(p.dict['memory_info'], 'rss', 0) for p in procs))
+        if scheduler.wait(reap) is None:
+            break
+    end, status, usage = reaped[0]
+    # wait4() also counts all the descendants that were waited for, including
+    # the ones that came and went between two samples
+    run = {
+        "wall": end - start,
+        "cpu_time": usage.ru_utime + usage.ru_stime,
+        "exit": os.WEXITSTATUS(status) if os.WIFEXITED(status) else -os.WTERMSIG(status),
+        "samples": len(cpu_samples),
+        "cpu_p50": percentile(cpu_samples, 50),
+        "cpu_p95": percentile(cpu_samples, 95),
+        "cpu_max": max(cpu_samples) if cpu_samples else None,
+        "rss_p50": percentile(rss_samples, 50),
+        "rss_p95": percentile(rss_samples, 95),
+        "rss_max": max(rss_samples) if rss_samples else None,
+    }
+    return run, cpu_samples, rss_samples
+
+def format_metric(value, unit):
+    if value is None:
+        return "-"
+    if unit == "B":
+        return bytes2human(value)
+    if unit == "%":
+        return "%.1f%%" % value
+    return "%.3fs" % value
+
+def arrangements(n1, n2):
+    """How many ways n1 + n2 ranks can be split into groups of n1 and n2."""
+    total = 1
+    for k in range(min(n1, n2)):
+        total = total * (n1 + n2 - k) // (k + 1)
+    return total
+
+def smallest_p(n1, n2):
+    """Smallest p mann_whitney() can give for these sample sizes: all current runs above all baseline runs."""
+    return 1.0 / arrangements(n1, n2)
+
+def mann_whitney(current, baseline):
+    """
+    One-sided Mann-Whitney U test for "current tends to be larger than
+    baseline". Returns (U, p). The p-value is exact (all rank assignments
+    are enumerated) while that is cheap, which it is for the handful of
+    runs a benchmark usually has, and from the normal approximation with
+    tie and continuity correction otherwise.
+    """
+    n1, n2 = len(current), len(baseline)
+    pooled = sorted((v, i < n1) for i, v in enumerate(current + baseline))
+    ranks = [0.0] * len(pooled)
+    ties = 0.0
+    i = 0
+    while i < len(pooled):
+        j = i
+        while j + 1 < len(pooled) and pooled[j + 1][0] == pooled[i][0]:
+            j += 1
+        for k in range(i, j + 1):
+            ranks[k] = (i + j) / 2.0 + 1
+        t = j - i + 1
+        ties += t ** 3 - t
+        i = j + 1
+    rank_sum = sum(r for r, (v, mine) in zip(ranks, pooled) if mine)
+    u = rank_sum - n1 * (n1 + 1) / 2.0
+    total = arrangements(n1, n2)
+    if total <= 50000:
+        offset = n1 * (n1 + 1) / 2.0
+        higher = sum(1 for picked in combinations(ranks, n1) if sum(picked) - offset >= u - 1e-9)
+        return u, float(higher) / total
+    n = n1 + n2
+    mean = n1 * n2 / 2.0
+    var = n1 * n2 / 12.0 * ((n + 1) - ties / (n * (n - 1)))
+    if var <= 0:
+        return u, 1.0
+    z = (u - mean - 0.5) / var ** 0.5
+    return u, 0.5 * math.erfc(z / 2 ** 0.5)
+
+def compare_runs(runs, baseline, alpha, threshold):
+    """Print the change of every metric against the baseline runs; return the list of regressed metrics."""
+    regressed = []
+    print "\nAgainst baseline (%d runs of %s):" % (len(baseline["runs"]), " ".join(baseline["command"]))
+    print "  %-10s %12s %12s %8s %8s" % ("metric", "baseline", "current", "change", "p")
+    for key, label, unit in RUN_METRICS:
+        old = [r[key] for r in baseline["runs"] if r.get(key) is not None]
+        new = [r[key] for r in runs if r.get(key) is not None]
+        if not old or not new:
+            continue
+        old_median = percentile(old, 50)
+        new_median = percentile(new, 50)
+        change = (new_median - old_median) * 100.0 / old_median if old_median else 0.0
+        u, p = mann_whitney(new, old)
+        # Significant and big enough to matter
+        flag = p < alpha and change > threshold
+        if flag:
+            regressed.append(label)
+        print "  %-10s %12s %12s %+7.1f%% %8.4f%s" % (label, format_metric(old_median, unit),
+                                                       format_metric(new_median, unit), change, p,
+                                                       "  REGRESSION" if flag else "")
+    return regressed
+
+def run_benchmark(cmd, options):
+    """--runs mode; returns the exit status (1 when a regression was found)."""
+    baseline = None
+    if options.compare:
+        with open(options.compare) as f:
+            baseline = json.load(f)
+        # With few runs even a clear regression cannot get below alpha
+        best = smallest_p(options.runs, len(baseline["runs"]))
+        if best >= options.alpha:
+            sys.stderr.write("%d runs against %d baseline runs cannot reach p < %g (smallest possible p is %.4f); "
+                             "use more --runs or a larger --alpha\n" % (options.runs, len(baseline["runs"]),
+                                                                        options.alpha, best))
+            return 2
+    runs = []
+    cpu_samples = []
+    rss_samples = []
+    for n in range(options.runs):
+        run, cpu, rss = run_once(cmd, options.interval)
+        runs.append(run)
+        cpu_samples.extend(cpu)
+        rss_samples.extend(rss)
+        print "Run %d/%d: exit %d, wall %.3fs, CPU %.3fs, CPU%% p95 %s, RSS max %s (%d samples)" % (
+            n + 1, options.runs, run["exit"], run["wall"], run["cpu_time"],
+            format_metric(run["cpu_p95"], "%"), format_metric(run["rss_max"], "B"), run["samples"])
+    cpu_times = [r["cpu_time"] for r in runs]
+    print "\n  %-10s %12s %12s %12s" % ("", "p50", "p95", "max")
+    for label, values, unit in (("CPU%", cpu_samples, "%"), ("RSS", rss_samples, "B"), ("CPU time", cpu_times, "s")):
+        print "  %-10s %12s %12s %12s" % (label, format_metric(percentile(values, 50), unit),
+                                          format_metric(percentile(values, 95), unit),
+                                          format_metric(max(values) if values else None, unit))
+    if options.save:
+        with open(options.save, 'w') as f:
+            json.dump({"command": cmd, "interval": options.interval, "time": time.time(), "runs": runs},
+                      f, indent=1, sort_keys=True)
+        print "\nBaseline saved into " + options.save
+    if baseline is not None:
+        regressed = compare_runs(runs, baseline, options.alpha, options.threshold)
+        if regressed:
+            print "\nRegressed: " + ", ".join(regressed)
+            return 1
+    return 0
 
             
 #Main
 def main():
+    tracker = None
+    scheduler = None
+    out = None
     try:
         # We process the options and flags given from the command line
-        parser = OptionParser(usage="usage: %prog [-o filename] [-n num] [-v] process_name", version="%prog 1.0")
+        parser = OptionParser(usage="usage: %prog [-o filename | -b filename] [-n num] [-i interval] [-v] [--collector psutil|procfs] process_name\n"
+                                    "       %prog --benchmark TICKS process_name\n"
+                                    "       %prog [-o filename | -b filename] [-n num] [-i interval] [-v] -p pid\n"
+                                    "       %prog --runs N [-i interval] [--save baseline.json] [--compare baseline.json] -- command [args]\n"
+                                    "       %prog --convert recording.bin [--to csv|npy] [-o filename]", version="%prog 1.0")
         parser.add_option("-o", "--output",
                           action="store", # optional because action defaults to "store"
                           dest="filename",
-                          default="output.csv",
                           metavar="FILE",
                           help="CSV file to save the output (default: output.csv)"
                           )
+        parser.add_option("-b", "--binary",
+                          action="store",
+                          dest="binary",
+                          metavar="FILE",
+                          help="Record raw values in a compact binary file instead of CSV")
+        parser.add_option("--retention",
+                          action="store",
+                          type="float",
+                          dest="retention",
+                          metavar="SECONDS",
+                          help="Make the binary file a ring buffer that keeps the last SECONDS of samples")
+        parser.add_option("--max-procs",
+                          action="store",
+                          type="int",
+                          dest="max_procs",
+                          default=32,
+                          metavar="N",
+                          help="Processes per tick the --retention ring is sized for (default: 32)")
+        parser.add_option("--convert",
+                          action="store",
+                          dest="convert",
+                          metavar="FILE",
+                          help="Convert a binary recording to CSV or NumPy and exit")
+        parser.add_option("--to",
+                          action="store",
+                          dest="to",
+                          choices=["csv", "npy"],
+                          default="csv",
+                          help="Format for --convert: csv or npy (default: csv)")
+        parser.add_option("--runs",
+                          action="store",
+                          type="int",
+                          dest="runs",
+                          metavar="N",
+                          help="Launch the command given as arguments N times, sample it until it exits and report percentiles")
+        parser.add_option("--save",
+                          action="store",
+                          dest="save",
+                          metavar="FILE",
+                          help="Save the runs of --runs as a baseline")
+        parser.add_option("--compare",
+                          action="store",
+                          dest="compare",
+                          metavar="FILE",
+                          help="Compare the runs of --runs against a saved baseline; exit status 1 on regressions. "
+                               "Needs enough runs on both sides to reach --alpha, e.g. 4 against 4 at 0.05")
+        parser.add_option("--alpha",
+                          action="store",
+                          type="float",
+                          dest="alpha",
+                          default=0.05,
+                          help="Significance level of the Mann-Whitney test for --compare (default: 0.05)")
+        parser.add_option("--threshold",
+                          action="store",
+                          type="float",
+                          dest="threshold",
+                          default=5.0,
+                          metavar="PERCENT",
+                          help="Ignore significant changes of the median below PERCENT (default: 5)")
         parser.add_option("-v", "--verbose",
                           action="store_true",
                           dest="verbose",
@@ -180,40 +1063,134 @@ def main():
                           action="store",
                           dest="iterations",
                           help="Number of seconds to record")
+        parser.add_option("-i", "--interval",
+                          action="store",
+                          type="float",
+                          dest="interval",
+                          default=1.0,
+                          metavar="SECONDS",
+                          help="Time between samples, e.g. 0.1 for 10 Hz (default: 1)")
+        parser.add_option("-p", "--pid",
+                          action="store",
+                          type="int",
+                          dest="pid",
+                          metavar="PID",
+                          help="Follow PID and all its descendants instead of processes by name")
+        parser.add_option("--collector",
+                          action="store",
+                          dest="collector",
+                          choices=["psutil", "procfs"],
+                          help="How to read the processes: psutil or procfs (default: procfs on Linux)")
+        parser.add_option("--benchmark",
+                          action="store",
+                          type="int",
+                          dest="benchmark",
+                          metavar="TICKS",
+                          help="Measure the per-sample cost of both collectors over TICKS samples and exit")
+        parser.add_option("-r", "--rescan",
+                          action="store",
+                          type="float",
+                          dest="rescan",
+                          metavar="SECONDS",
+                          help="Look for new processes with that name, or new children with -p, "
+                               "every SECONDS (default: 5, or 1 with -p)")
+        parser.add_option("--flush",
+                          action="store",
+                          type="float",
+                          dest="flush",
+                          default=2.0,
+                          metavar="SECONDS",
+                          help="Write buffered CSV rows to disk every SECONDS (default: 2)")
         
         (options, args) = parser.parse_args()
         
-        if len(args) != 1:
+        if options.convert:
+            output = options.filename or os.path.splitext(options.convert)[0] + "." + options.to
+            count = convert(options.convert, options.to, output)
+            print "Converted %d samples into %s" % (count, output)
+            return
+        if options.runs is not None:
+            if not args or options.runs < 1:
+                parser.error("--runs needs a positive count and a command")
+            if options.interval <= 0:
+                parser.error("Interval must be positive")
+            try:
+                return run_benchmark(args, options)
+            except OSError as e:
+                parser.error("Cannot run %s: %s" % (args[0], e.strerror))
+        if len(args) != (0 if options.pid else 1):
             parser.error("Wrong number of arguments")
+        if options.interval <= 0:
+            parser.error("Interval must be positive")
         
-        pname = args[0]
-        csvfile = options.filename
-        seconds = int(options.iterations)
-        
-        if options.verbose == True:
-            csvfile="__no_output_just_verbose"
+        if options.pid:
+            try:
+                tracker = TreeTracker(options.pid, options.rescan or 1.0)
+            except psutil.NoSuchProcess:
+                parser.error("No process with PID %d" % options.pid)
+            pname = "tree:%d" % options.pid
         else:
+            pname = args[0]
+            if options.benchmark:
+                collector_benchmark(pname, options.benchmark)
+                return
+            collector = options.collector
+            if collector is None:
+                collector = "procfs" if sys.platform.startswith('linux') else "psutil"
+            if collector == "procfs":
+                tracker = ProcfsTracker(pname, options.rescan or 5.0)
+            else:
+                tracker = ProcessTracker(pname, options.rescan or 5.0)
+        csvfile = options.filename or "output.csv"
+        seconds = float(options.iterations) if options.iterations else None
+        
+        if options.binary:
+            capacity = 0
+            if options.retention:
+                capacity = ring_capacity(options.retention, options.interval, options.max_procs)
+            out = BinaryOutput(options.binary, pname, capacity, options.flush)
+            print "Recording into " + options.binary + (" (ring of %s)" % bytes2human(capacity) if capacity else "")
+            print " ...press CTRL + C to stop..."
+        elif options.verbose != True:
             if os.path.isfile(csvfile):
                 if query_yes_no ("File " + csvfile + " already exists. Overwrite?"):
                     os.remove(csvfile)
             print "Writing CSV file into " + csvfile
             print " ...press CTRL + C to stop..."
+            out = CsvOutput(csvfile, options.flush)
             
-        now = int(time.time())
-        cont = 0
-        interval = 0.1
-        args = poll(interval, "header", csvfile)
+        if options.pid and not options.binary:
+            if out is not None:
+                out.write(TREE_HEADER)
+            else:
+                print TREE_HEADER
+        elif not options.binary:
+            writeheader(out)
+        scheduler = Scheduler(options.interval)
         while 1:
-            writecsv(*args)
-            interval = 1
-            args = poll(interval, pname, csvfile)
-            cont = cont + 1
-            if cont > seconds:
+            missed = scheduler.wait()
+            if missed:
+                sys.stderr.write("# missed %d tick(s) before t=%s\n" % (missed, scheduler.elapsed()))
+            procs, procs_status = tracker.sample()
+            if out is None:
+                sys.stderr.write("# sampler: %.2f ms CPU, %d process(es)\n" % (tracker.cpu_last * 1000, len(procs)))
+            if options.binary:
+                out.write(procs)
+            elif options.pid:
+                writetree(procs, out, scheduler.elapsed())
+            else:
+                writecsv(procs, procs_status, out, scheduler.elapsed())
+            if seconds is not None and scheduler.elapsed() >= seconds:
                 sys.exit(0)
     except (KeyboardInterrupt, SystemExit):
+        if out is not None:
+            out.close()
         print "\nFinished."
-        pass
+        if tracker is not None:
+            print tracker.report()
+        if scheduler is not None:
+            print "Missed ticks: %d of %d" % (scheduler.missed, scheduler.tick)
     
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
@@ -6,25 +6,46 @@ and download their TXT versions from https://www.rfc-editor.org/rfc/
 Outputs:
   - dns-rfcs.txt       (RFC number list, icann/rfc-annotations compatible)
   - raw-originals/     (downloaded TXT files)
+  - raw-originals/.manifest.json  (ETag/Last-Modified/size per URL, for
+                                   conditional GETs on the next run)
 """
 
+from __future__ import annotations
+
+import asyncio
+import http.server
+import json
+import multiprocessing
+import os
+import random
 import re
+import shutil
+import ssl
 import sys
+import tarfile
+import tempfile
 import time
+import urllib.parse
 import urllib.request
 import urllib.error
 from pathlib import Path
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from email.message import Message
+from email.utils import formatdate
+from functools import partial
 
 # --- Configuration ---
 RFC_INDEX_URL   = "https://www.ietf.org/rfc/rfc-index.txt"
 RFC_BASE_URL    = "https://www.rfc-editor.org/rfc"
+RFC_ARCHIVE_URL = "https://www.rfc-editor.org/in-notes/tar/RFC-all.tar.gz"
 OUTPUT_FILE     = "dns-rfcs.txt"
 DOWNLOAD_DIR    = Path("raw-originals")
 MAX_WORKERS     = 8       # concurrent downloads
 RETRY_ATTEMPTS  = 3
 RETRY_DELAY     = 2.0     # seconds between retries
 REQUEST_TIMEOUT = 30      # seconds
+MANIFEST_NAME   = ".manifest.json"
+INDEX_CACHE     = "rfc-index.txt"
 
 DNS_KEYWORDS = [
     r"\bDNS\b",
@@ -57,6 +78,90 @@ def fetch_url(url: str, timeout: int = REQUEST_TIMEOUT) -> str:
     with urllib.request.urlopen(req, timeout=timeout) as r:
         return r.read().decode("utf-8", errors="replace")
 
+def fetch_conditional(url: str, cached: dict | None = None,
+                      timeout: int = REQUEST_TIMEOUT) -> tuple[bytes | None, dict]:
+    """
+    GET url, sending the validators of a previous response so that an
+    unchanged resource costs a 304 and no body. Returns (body, manifest
+    entry); body is None when the server says the copy we have is current.
+    """
+    req = urllib.request.Request(url, headers=request_headers(cached))
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as r:
+            body = r.read()
+            info = r.headers
+    except urllib.error.HTTPError as e:
+        if e.code != 304:
+            raise
+        return None, revalidated(cached, e.headers)
+    return body, manifest_entry(info, len(body))
+
+def request_headers(cached: dict | None) -> dict:
+    headers = {"User-Agent": "rfc-dns-fetcher/1.0"}
+    if cached:
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+    return headers
+
+def manifest_entry(headers, size: int) -> dict:
+    return {"etag": headers.get("ETag"), "last_modified": headers.get("Last-Modified"), "size": size}
+
+def revalidated(cached: dict, headers) -> dict:
+    entry = dict(cached)
+    # A 304 may carry updated validators
+    if headers.get("ETag"):
+        entry["etag"] = headers["ETag"]
+    if headers.get("Last-Modified"):
+        entry["last_modified"] = headers["Last-Modified"]
+    return entry
+
+def load_manifest(dest_dir: Path) -> dict:
+    try:
+        return json.loads((dest_dir / MANIFEST_NAME).read_text())
+    except (OSError, ValueError):
+        return {}
+
+def save_manifest(dest_dir: Path, manifest: dict) -> None:
+    dest_dir.mkdir(parents=True, exist_ok=True)
+    tmp = dest_dir / (MANIFEST_NAME + ".tmp")
+    tmp.write_text(json.dumps(manifest, indent=1, sort_keys=True) + "\n")
+    os.replace(tmp, dest_dir / MANIFEST_NAME)
+
+def write_file(filename: Path, data: bytes) -> None:
+    """Write data to filename via a .part file, so an interrupted run never leaves it truncated."""
+    tmp = filename.with_name(filename.name + ".part")
+    tmp.write_bytes(data)
+    os.replace(tmp, filename)
+
+def cached_entry(manifest: dict, url: str, path: Path, force: bool = False) -> dict | None:
+    """Validators to revalidate path with, or None when it has to be fetched in full."""
+    if force or not path.exists():
+        return None
+    st = path.stat()
+    if url not in manifest:
+        # Downloaded before there was a manifest: its mtime is when we got it
+        return {"etag": None, "last_modified": formatdate(st.st_mtime, usegmt=True), "size": st.st_size}
+    entry = manifest[url]
+    if entry.get("size") != st.st_size:
+        # Edited or truncated locally: fetch it again
+        return None
+    return entry
+
+def fetch_index(url: str, dest_dir: Path, manifest: dict, force: bool = False) -> str:
+    """rfc-index.txt, refreshed with a conditional GET into dest_dir."""
+    path = dest_dir / INDEX_CACHE
+    entry = cached_entry(manifest, url, path, force)
+    body, manifest[url] = fetch_conditional(url, entry)
+    if body is None:
+        print("RFC index unchanged, using cached copy")
+        body = path.read_bytes()
+    else:
+        dest_dir.mkdir(parents=True, exist_ok=True)
+        write_file(path, body)
+    return body.decode("utf-8", errors="replace")
+
 def parse_rfc_entries(text: str) -> list[dict]:
     """Reassemble multi-line RFC index entries into single records."""
     entries = []
@@ -89,55 +194,437 @@ def is_dns_related(entry: dict) -> bool:
 
 # --- Downloading ---
 
-def download_rfc(number: int, dest_dir: Path, force: bool = False) -> tuple[int, str]:
+def download_rfc(number: int, dest_dir: Path, force: bool = False, cached: dict | None = None,
+                 base_url: str = RFC_BASE_URL) -> tuple[int, str, dict | None]:
     """
-    Download rfcNNNN.txt to dest_dir.
-    Returns (number, status) where status is 'ok', 'skipped', or 'error: ...'
+    Download rfcNNNN.txt to dest_dir, or revalidate it if it is already there.
+    Returns (number, status, manifest entry) where status is 'ok', 'updated',
+    'unchanged', or 'error: ...'
     """
     filename = dest_dir / f"rfc{number}.txt"
-
-    if filename.exists() and not force:
-        return number, "skipped"
-
-    url = f"{RFC_BASE_URL}/rfc{number}.txt"
+    existed = filename.exists()
+    url = f"{base_url}/rfc{number}.txt"
+    if force:
+        cached = None
 
     for attempt in range(1, RETRY_ATTEMPTS + 1):
         try:
-            content = fetch_url(url)
-            filename.write_text(content, encoding="utf-8")
-            return number, "ok"
+            content, entry = fetch_conditional(url, cached)
+            if content is None:
+                return number, "unchanged", entry
+            write_file(filename, content)
+            return number, "updated" if existed else "ok", entry
         except urllib.error.HTTPError as e:
             if e.code == 404:
-                return number, f"error: 404 not found"
+                return number, f"error: 404 not found", None
             if attempt < RETRY_ATTEMPTS:
                 time.sleep(RETRY_DELAY * attempt)
         except Exception as e:
             if attempt < RETRY_ATTEMPTS:
                 time.sleep(RETRY_DELAY * attempt)
             else:
-                return number, f"error: {e}"
+                return number, f"error: {e}", None
 
-    return number, f"error: max retries exceeded"
+    return number, f"error: max retries exceeded", None
 
-def download_all(rfc_numbers: list[int], dest_dir: Path, force: bool = False) -> dict:
+def download_all(rfc_numbers: list[int], dest_dir: Path, force: bool = False, manifest: dict | None = None,
+                 base_url: str = RFC_BASE_URL, workers: int = MAX_WORKERS, verbose: bool = True) -> dict:
     dest_dir.mkdir(parents=True, exist_ok=True)
+    if manifest is None:
+        manifest = {}
     results = {}
     total = len(rfc_numbers)
 
-    print(f"\nDownloading {total} RFCs to {dest_dir}/ (workers={MAX_WORKERS}) ...")
+    if verbose:
+        print(f"\nDownloading {total} RFCs to {dest_dir}/ (workers={workers}) ...")
 
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
-        futures = {pool.submit(download_rfc, n, dest_dir, force): n for n in rfc_numbers}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {}
+        for n in rfc_numbers:
+            url = f"{base_url}/rfc{n}.txt"
+            cached = cached_entry(manifest, url, dest_dir / f"rfc{n}.txt", force)
+            futures[pool.submit(download_rfc, n, dest_dir, force, cached, base_url)] = url
         done = 0
         for future in as_completed(futures):
-            number, status = future.result()
+            number, status, entry = future.result()
+            results[number] = status
+            if entry is not None:
+                manifest[futures[future]] = entry
+            done += 1
+            if verbose:
+                print_progress(done, total, number, status)
+
+    save_manifest(dest_dir, manifest)
+    return results
+
+def print_progress(done: int, total: int, number: int, status: str) -> None:
+    symbol = "✓" if status in ("ok", "updated") else "–" if status == "unchanged" else "✗"
+    print(f"  [{done:3d}/{total}] {symbol} RFC{number:04d}  {status}")
+
+# --- Bulk archive ---
+
+ARCHIVE_MEMBER = re.compile(r"(?:^|/)rfc(\d+)\.txt$")
+
+def extract_archive(rfc_numbers: list[int], dest_dir: Path, force: bool = False, manifest: dict | None = None,
+                    archive_url: str = RFC_ARCHIVE_URL, base_url: str = RFC_BASE_URL,
+                    verbose: bool = True) -> dict:
+    """
+    Fetch the tar.gz bundle of all RFCs and extract only rfcNNNN.txt for the
+    wanted numbers. The archive is decompressed as it arrives and never
+    stored; the transfer stops as soon as every wanted member has been seen.
+    """
+    dest_dir.mkdir(parents=True, exist_ok=True)
+    if manifest is None:
+        manifest = {}
+    wanted = set(rfc_numbers)
+    results = {}
+    total = len(wanted)
+    cached = None if force else manifest.get(archive_url)
+    if cached:
+        # A 304 only helps if every wanted file is still what we extracted
+        sizes = cached.get("members", {})
+        for n in wanted:
+            path = dest_dir / f"rfc{n}.txt"
+            if not path.exists() or sizes.get(str(n)) != path.stat().st_size:
+                cached = None
+                break
+
+    if verbose:
+        print(f"\nExtracting {total} RFCs from {archive_url} to {dest_dir}/ ...")
+
+    # Saved on every way out: fetch_index() may have refreshed the index
+    # entry, and a 304 refreshes the archive's validators
+    try:
+        req = urllib.request.Request(archive_url, headers=request_headers(cached))
+        try:
+            r = urllib.request.urlopen(req, timeout=REQUEST_TIMEOUT)
+        except urllib.error.HTTPError as e:
+            if e.code != 304:
+                return {n: f"error: archive: HTTP {e.code}" for n in wanted}
+            manifest[archive_url] = revalidated(cached, e.headers)
+            return {n: "unchanged" for n in wanted}
+        except (OSError, ValueError) as e:
+            return {n: f"error: archive: {e}" for n in wanted}
+
+        try:
+            with r, tarfile.open(fileobj=r, mode="r|gz") as tar:
+                for member in tar:
+                    m = ARCHIVE_MEMBER.search(member.name)
+                    if not m or not member.isfile() or int(m.group(1)) not in wanted:
+                        continue
+                    number = int(m.group(1))
+                    wanted.discard(number)
+                    results[number] = store_member(tar.extractfile(member), dest_dir / f"rfc{number}.txt")
+                    if results[number] != "unchanged":
+                        # The per-file validators no longer describe this copy
+                        manifest.pop(f"{base_url}/rfc{number}.txt", None)
+                    if verbose:
+                        print_progress(len(results), total, number, results[number])
+                    if not wanted:
+                        break
+        except (OSError, EOFError, tarfile.TarError) as e:
+            for n in wanted:
+                results[n] = f"error: archive: {e}"
+            return results
+
+        for n in wanted:
+            results[n] = "error: not in archive"
+        entry = manifest_entry(r.headers, int(r.headers.get("Content-Length") or 0))
+        entry["members"] = {str(n): (dest_dir / f"rfc{n}.txt").stat().st_size
+                            for n, status in results.items() if not status.startswith("error")}
+        manifest[archive_url] = entry
+        return results
+    finally:
+        save_manifest(dest_dir, manifest)
+
+def store_member(source, filename: Path) -> str:
+    """Write an archive member to filename via a temporary file; returns its status."""
+    tmp = filename.with_name(filename.name + ".part")
+    with open(tmp, "wb") as f:
+        shutil.copyfileobj(source, f)
+    if filename.exists():
+        if filename.stat().st_size == tmp.stat().st_size and filename.read_bytes() == tmp.read_bytes():
+            tmp.unlink()
+            return "unchanged"
+        os.replace(tmp, filename)
+        return "updated"
+    os.replace(tmp, filename)
+    return "ok"
+
+# --- Async downloading ---
+#
+# One event loop instead of a thread per download: connections are kept alive
+# and reused per host, a semaphore caps the requests in flight, and a retry
+# backs off without holding a slot. Plain HTTP/1.1 over asyncio streams, so no
+# dependencies beyond the standard library.
+
+class ConnectionPool:
+    """Idle keep-alive connections per (scheme, host, port)."""
+
+    def __init__(self, limit: int, timeout: float = REQUEST_TIMEOUT):
+        self.limit = limit
+        self.timeout = timeout
+        self.idle: dict[tuple, list] = {}
+        self.opened = 0
+        self.ssl = None
+
+    async def connect(self, key: tuple):
+        scheme, host, port = key
+        context = None
+        if scheme == "https":
+            if self.ssl is None:
+                self.ssl = ssl.create_default_context()
+            context = self.ssl
+        self.opened += 1
+        return await asyncio.wait_for(asyncio.open_connection(host, port, ssl=context), self.timeout)
+
+    async def get(self, url: str, headers: dict, dest: Path | None = None) -> tuple[int, Message, int]:
+        """
+        GET url, following redirects. A 200 body is streamed into a temporary
+        file next to dest and renamed over it once complete; other bodies are
+        read and dropped so the connection can be reused. Returns (status,
+        response headers, body size).
+        """
+        for _ in range(5):
+            parts = urllib.parse.urlsplit(url)
+            port = parts.port or (443 if parts.scheme == "https" else 80)
+            target = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+            request = [f"GET {target} HTTP/1.1", f"Host: {parts.netloc}"]
+            request += [f"{name}: {value}" for name, value in headers.items()]
+            request = ("\r\n".join(request) + "\r\n\r\n").encode("latin-1")
+            status, response, size = await self.exchange((parts.scheme, parts.hostname, port), request, dest)
+            if status in (301, 302, 303, 307, 308) and response.get("Location"):
+                url = urllib.parse.urljoin(url, response["Location"])
+                continue
+            return status, response, size
+        raise OSError(f"too many redirects for {url}")
+
+    async def exchange(self, key: tuple, request: bytes, dest: Path | None) -> tuple[int, Message, int]:
+        idle = self.idle.setdefault(key, [])
+        while True:
+            reused = bool(idle)
+            reader, writer = idle.pop() if reused else await self.connect(key)
+            try:
+                writer.write(request)
+                await writer.drain()
+                status_line = await reader.readline()
+                if not status_line:
+                    raise ConnectionResetError("connection closed by server")
+            except (ConnectionError, asyncio.IncompleteReadError):
+                writer.close()
+                if reused:
+                    # The server dropped an idle connection: not a failed attempt
+                    continue
+                raise
+            except BaseException:
+                writer.close()
+                raise
+            try:
+                status, response, size, reusable = await self.read_response(status_line, reader, dest)
+            except BaseException:
+                writer.close()
+                raise
+            if reusable and len(idle) < self.limit:
+                idle.append((reader, writer))
+            else:
+                writer.close()
+            return status, response, size
+
+    async def read_response(self, status_line: bytes, reader, dest: Path | None) -> tuple[int, Message, int, bool]:
+        version, status = status_line.split(None, 2)[:2]
+        status = int(status)
+        response = Message()
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            response[name.strip()] = value.strip()
+        reusable = version == b"HTTP/1.1" and response.get("Connection", "").lower() != "close"
+        if status in (204, 304) or status < 200:
+            return status, response, 0, reusable
+        chunked = "chunked" in response.get("Transfer-Encoding", "").lower()
+        if not chunked and response.get("Content-Length") is None:
+            # Body runs until the server closes the connection
+            reusable = False
+        tmp = sink = None
+        if status == 200 and dest is not None:
+            tmp = dest.with_name(dest.name + ".part")
+            sink = open(tmp, "wb")
+        size = 0
+        try:
+            async for chunk in self.read_body(reader, chunked, response.get("Content-Length")):
+                size += len(chunk)
+                if sink is not None:
+                    sink.write(chunk)
+        except BaseException:
+            if sink is not None:
+                sink.close()
+                tmp.unlink(missing_ok=True)
+            raise
+        if sink is not None:
+            sink.close()
+            os.replace(tmp, dest)
+        return status, response, size, reusable
+
+    @staticmethod
+    async def read_body(reader, chunked: bool, length: str | None):
+        if chunked:
+            while True:
+                size = int((await reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    # Trailers
+                    while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                        pass
+                    return
+                yield await reader.readexactly(size)
+                await reader.readexactly(2)
+        elif length is not None:
+            left = int(length)
+            while left:
+                chunk = await reader.read(min(left, 65536))
+                if not chunk:
+                    raise asyncio.IncompleteReadError(b"", left)
+                left -= len(chunk)
+                yield chunk
+        else:
+            while chunk := await reader.read(65536):
+                yield chunk
+
+    def close(self) -> None:
+        for connections in self.idle.values():
+            for reader, writer in connections:
+                writer.close()
+        self.idle.clear()
+
+async def download_rfc_async(pool: ConnectionPool, slots: asyncio.Semaphore, number: int, dest_dir: Path,
+                             cached: dict | None = None, base_url: str = RFC_BASE_URL) -> tuple[int, str, dict | None]:
+    """download_rfc() on a shared ConnectionPool; at most one request per slot."""
+    filename = dest_dir / f"rfc{number}.txt"
+    existed = filename.exists()
+    url = f"{base_url}/rfc{number}.txt"
+    headers = request_headers(cached)
+    error = "error: max retries exceeded"
+
+    for attempt in range(1, RETRY_ATTEMPTS + 1):
+        try:
+            async with slots:
+                status, response, size = await asyncio.wait_for(pool.get(url, headers, filename), REQUEST_TIMEOUT)
+        except (OSError, ValueError, asyncio.TimeoutError, asyncio.IncompleteReadError) as e:
+            # TimeoutError has no message
+            error = f"error: {e or type(e).__name__}"
+        else:
+            if status == 304 and cached:
+                return number, "unchanged", revalidated(cached, response)
+            if status == 200:
+                return number, "updated" if existed else "ok", manifest_entry(response, size)
+            if status == 404:
+                return number, f"error: 404 not found", None
+            error = f"error: HTTP {status}"
+        if attempt < RETRY_ATTEMPTS:
+            # Jittered exponential backoff, outside the semaphore
+            await asyncio.sleep(RETRY_DELAY * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+
+    return number, error, None
+
+async def download_all_async(rfc_numbers: list[int], dest_dir: Path, force: bool = False,
+                             manifest: dict | None = None, base_url: str = RFC_BASE_URL,
+                             workers: int = MAX_WORKERS, verbose: bool = True) -> dict:
+    dest_dir.mkdir(parents=True, exist_ok=True)
+    if manifest is None:
+        manifest = {}
+    results = {}
+    total = len(rfc_numbers)
+
+    if verbose:
+        print(f"\nDownloading {total} RFCs to {dest_dir}/ (async, {workers} in flight) ...")
+
+    pool = ConnectionPool(workers)
+    slots = asyncio.Semaphore(workers)
+    urls = {}
+    tasks = []
+    for n in rfc_numbers:
+        urls[n] = f"{base_url}/rfc{n}.txt"
+        cached = cached_entry(manifest, urls[n], dest_dir / f"rfc{n}.txt", force)
+        tasks.append(download_rfc_async(pool, slots, n, dest_dir, cached, base_url))
+    done = 0
+    try:
+        for task in asyncio.as_completed(tasks):
+            number, status, entry = await task
             results[number] = status
+            if entry is not None:
+                manifest[urls[number]] = entry
             done += 1
-            symbol = "✓" if status == "ok" else "–" if status == "skipped" else "✗"
-            print(f"  [{done:3d}/{total}] {symbol} RFC{number:04d}  {status}")
+            if verbose:
+                print_progress(done, total, number, status)
+    finally:
+        pool.close()
 
+    save_manifest(dest_dir, manifest)
     return results
 
+class BenchmarkHandler(http.server.SimpleHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; with Nagle on, every
+    # keep-alive response would wait for a delayed ACK
+    disable_nagle_algorithm = True
+    handshake = 0.0
+
+    def setup(self):
+        # Stands in for the TCP and TLS setup of a real server
+        time.sleep(self.handshake)
+        super().setup()
+
+    def log_message(self, *args):
+        pass
+
+class BenchmarkServer(http.server.ThreadingHTTPServer):
+    # The default backlog of 5 drops the SYNs of a burst of connections,
+    # which then wait a second for the retransmit
+    request_queue_size = 128
+
+def serve_benchmark(root: str, handshake: float, ports) -> None:
+    BenchmarkHandler.handshake = handshake
+    server = BenchmarkServer(("127.0.0.1", 0), partial(BenchmarkHandler, directory=root))
+    ports.put(server.server_port)
+    server.serve_forever()
+
+def benchmark(count: int, size: int, handshake: float, workers: int) -> None:
+    """
+    Download count synthetic RFCs of size bytes with both engines from a
+    local HTTP/1.1 server that spends handshake seconds on every new
+    connection. The server runs in its own process so that it does not
+    compete with the client for the GIL.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp) / "server"
+        (root / "rfc").mkdir(parents=True)
+        numbers = list(range(1, count + 1))
+        for n in numbers:
+            (root / "rfc" / f"rfc{n}.txt").write_bytes(os.urandom(size // 2).hex().encode())
+        ports = multiprocessing.Queue()
+        server = multiprocessing.Process(target=serve_benchmark, args=(str(root), handshake, ports), daemon=True)
+        server.start()
+        base_url = f"http://127.0.0.1:{ports.get()}/rfc"
+        print(f"{count} files of {size} bytes, {handshake * 1000:.0f} ms per new connection, {workers} workers")
+        try:
+            for engine in ("threads", "async"):
+                dest = Path(tmp) / engine
+                start = time.perf_counter()
+                if engine == "async":
+                    results = asyncio.run(download_all_async(numbers, dest, base_url=base_url,
+                                                             workers=workers, verbose=False))
+                else:
+                    results = download_all(numbers, dest, base_url=base_url, workers=workers, verbose=False)
+                elapsed = time.perf_counter() - start
+                ok = sum(1 for n in numbers
+                         if results[n] == "ok" and (dest / f"rfc{n}.txt").read_bytes() ==
+                         (root / "rfc" / f"rfc{n}.txt").read_bytes())
+                print(f"  {engine:8s} {elapsed:7.3f}s  {count / elapsed:8.1f} files/s  {ok}/{count} verified")
+        finally:
+            server.terminate()
+            server.join()
+
 # --- Main ---
 
 def main():
@@ -147,18 +634,36 @@ def main():
     parser.add_argument("--output",     default=OUTPUT_FILE,        help="RFC list output file")
     parser.add_argument("--dest",       default=str(DOWNLOAD_DIR),  help="Download directory")
     parser.add_argument("--workers",    type=int, default=MAX_WORKERS, help="Concurrent downloads")
-    parser.add_argument("--force",      action="store_true",         help="Re-download existing files")
+    parser.add_argument("--force",      action="store_true",         help="Re-download existing files unconditionally")
+    parser.add_argument("--engine",     choices=["threads", "async"], default="threads",
+                        help="threads: a urllib request per file; async: keep-alive connections on one event loop")
+    parser.add_argument("--benchmark",  type=int, metavar="N",
+                        help="Compare both engines on N synthetic files from a local server and exit")
+    parser.add_argument("--bench-size", type=int, default=60000, help="File size for --benchmark")
+    parser.add_argument("--bench-handshake", type=float, default=20.0, metavar="MS",
+                        help="Delay per new connection for --benchmark")
+    parser.add_argument("--bulk",       action="store_true",
+                        help="Extract the listed RFCs from the tar.gz bundle of all RFCs instead of one request each")
+    parser.add_argument("--archive-url", default=RFC_ARCHIVE_URL,    help="URL of the tar.gz bundle for --bulk")
+    parser.add_argument("--index-url",  default=RFC_INDEX_URL,       help="URL of rfc-index.txt")
+    parser.add_argument("--base-url",   default=RFC_BASE_URL,        help="Base URL the rfcNNNN.txt files are fetched from")
     parser.add_argument("--list-only",  action="store_true",         help="Only generate list, skip download")
     parser.add_argument("--skip-list",  action="store_true",         help="Only download (reuse existing list)")
     args = parser.parse_args()
 
+    if args.benchmark:
+        benchmark(args.benchmark, args.bench_size, args.bench_handshake / 1000, args.workers)
+        return
+
     dest_dir = Path(args.dest)
     output   = Path(args.output)
 
+    manifest = load_manifest(dest_dir)
+
     # Step 1: Build DNS RFC list
     if not args.skip_list:
-        print(f"Fetching RFC index from {RFC_INDEX_URL} ...")
-        raw = fetch_url(RFC_INDEX_URL)
+        print(f"Fetching RFC index from {args.index_url} ...")
+        raw = fetch_index(args.index_url, dest_dir, manifest, args.force)
 
         entries = parse_rfc_entries(raw)
         print(f"Parsed {len(entries)} RFC entries")
@@ -180,16 +685,27 @@ def main():
         print(f"Loaded {len(dns_numbers)} RFC numbers from {output}")
 
     if args.list_only:
+        if not args.skip_list:
+            save_manifest(dest_dir, manifest)
         return
 
     # Step 2: Download TXT files
-    results = download_all(dns_numbers, dest_dir, force=args.force)
+    if args.bulk:
+        results = extract_archive(dns_numbers, dest_dir, force=args.force, manifest=manifest,
+                                  archive_url=args.archive_url, base_url=args.base_url)
+    elif args.engine == "async":
+        results = asyncio.run(download_all_async(dns_numbers, dest_dir, force=args.force, manifest=manifest,
+                                                 base_url=args.base_url, workers=args.workers))
+    else:
+        results = download_all(dns_numbers, dest_dir, force=args.force, manifest=manifest,
+                               base_url=args.base_url, workers=args.workers)
 
-    ok      = sum(1 for s in results.values() if s == "ok")
-    skipped = sum(1 for s in results.values() if s == "skipped")
-    errors  = {n: s for n, s in results.items() if s.startswith("error")}
+    ok        = sum(1 for s in results.values() if s == "ok")
+    updated   = sum(1 for s in results.values() if s == "updated")
+    unchanged = sum(1 for s in results.values() if s == "unchanged")
+    errors    = {n: s for n, s in results.items() if s.startswith("error")}
 
-    print(f"\nSummary: {ok} downloaded, {skipped} skipped, {len(errors)} errors")
+    print(f"\nSummary: {ok} downloaded, {updated} updated, {unchanged} unchanged, {len(errors)} errors")
     if errors:
         print("Errors:")
         for n, s in sorted(errors.items()):